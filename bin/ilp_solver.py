@@ -9,7 +9,9 @@ ILP formulation for Container-Node Assignment
 
 import os
 import sys
+import tempfile
 from time import time
+import numpy as np
 from pulp import *
 
 start_time = time()
@@ -18,21 +20,47 @@ modules_dir = os.path.join(BASEDIR, '../modules')
 sys.path.append(modules_dir)
 
 from parsing_xml import *
+from feasibility import FeasibilityIndex
+import matrix_model
+from matrix_model import MatrixModel
+from node_classes import NodeClassModel
+from decomposition import RegionDecomposition
+from solver_backend import SolverOptions, pulp_solver, resolve_backend, cbc_log_stats
+from warm_start import greedy_start
+from result_cache import CachedSolution, state_digest
+from assignment import Assignment
 from parameters import *
 from writing_output import *
 from xml_generator import configuration
 
 
-def main(appl, infra, output_file):
+def main(appl, infra, output_file, builder='pulp', model=None, solver=None, warm_start=False, cache=None, compare=False):
+    """
+    Build and solve the ILP for the given application and infrastructure.
+    builder='pulp' builds the model with PuLP expressions, builder='matrix'
+    generates it as sparse coefficient arrays (see matrix_model.py) and
+    builder='aggregated' does the same with integer counts of interchangeable
+    containers, builder='node_classes' solves it over classes of similar
+    nodes (see node_classes.py) and builder='regions' solves the regions in
+    parallel (see decomposition.py); all return an object with the status,
+    solutionTime and variables() of the solution.
+    If an IncrementalModel is given, its live model is updated for the containers of appl.
+    solver is a SolverOptions (backend, threads, gap, time limit, presolve);
+    by default CBC is used with its default settings. With warm_start=True
+    a greedy assignment (see warm_start.py) is given to the solver as MIP start.
+    If a ResultCache is given, the solution of the same containers, node state
+    and settings is reused (see result_cache.py). With compare=True the node
+    classes and the regions are checked against the exact model: its
+    objective and the objective loss are added to the report.
+    """
+    if cache is not None:
+        return cached_main(appl, infra, output_file, builder, model, solver, warm_start, cache, compare)
+    if builder in ('matrix', 'aggregated', 'node_classes', 'regions') or model is not None:
+        return matrix_main(appl, infra, output_file, model, builder, solver, warm_start, compare)
     
     # Precompute valid (container, node) pairs
-    valid_pairs = {}
-    for container in appl.containerList:
-        valid_nodes = [node for node in infra.nodeList if container.nodeType == node.type 
-                       and node.risk <= container.risk 
-                       and (container.region == 0 or container.region == node.region)
-                       and (node.activation == 0 or container.nodeType == 'cloud-cpu')]
-        valid_pairs[container] = valid_nodes
+    feasibility = FeasibilityIndex(appl.containerList, infra.nodeList)
+    containers, nodes = feasibility.containers, feasibility.nodes
     
     # --------------------------------------------------------------------------
     # Generate ILP Problem
@@ -41,19 +69,21 @@ def main(appl, infra, output_file):
     problem_start = time()
     
     # Define decision variables
-    decision_vars = { (container, node): LpVariable(f'X_{container.id}_{node.id}', cat='Binary')
-                      for container, nodes in valid_pairs.items() for node in nodes }
+    x_vars = [LpVariable(f'X_{containers[i].id}_{nodes[j].id}', cat='Binary')
+              for i, j in zip(feasibility.pair_container, feasibility.pair_node)]
+    decision_vars = { (containers[i], nodes[j]): var
+                      for i, j, var in zip(feasibility.pair_container, feasibility.pair_node, x_vars) }
     node_usage = { node: LpVariable(f'Y_{node.id}', cat='Binary') for node in infra.nodeList if node.type == 'cloud-cpu' }
     
     # Initialise problem
     problem = LpProblem("Container_Node_Assignment", LpMinimize)
     
     # Constraints
-    for container in appl.containerList:
-        problem += lpSum(decision_vars[(container, node)] for node in valid_pairs[container]) == 1, f"unicity_{container.id}"
+    for i, container in enumerate(containers):
+        problem += lpSum(decision_vars[(container, nodes[j])] for j in feasibility.nodes_for(i)) == 1, f"unicity_{container.id}"
     
-    for node in infra.nodeList:
-        valid_containers = [container for container in appl.containerList if (container, node) in decision_vars]
+    for j, node in enumerate(nodes):
+        valid_containers = [containers[i] for i in feasibility.containers_for(j)]
         problem += lpSum(decision_vars[(container, node)] * container.Ncore for container in valid_containers) <= node.Ncore, f"CPU_{node.id}"
         problem += lpSum(decision_vars[(container, node)] * container.mainMemory for container in valid_containers) <= node.mainMemory, f"memory_{node.id}"
     
@@ -106,7 +136,45 @@ def main(appl, infra, output_file):
     # --------------------------------------------------------------------------
     # Solve Problem and Display Results
     # --------------------------------------------------------------------------
-    problem.solve() 
+    solve_start = time()
+    start_objective = None
+    if warm_start:
+        counts, start_complete = greedy_start(feasibility, cloud_containers, edge_containers, theta_risk, theta_el)
+        for var, count in zip(x_vars, counts.tolist()):
+            var.setInitialValue(count)
+        on_node = np.bincount(feasibility.pair_node, weights=counts, minlength=len(nodes))
+        for j, node in enumerate(nodes):
+            if node in node_usage:
+                node_usage[node].setInitialValue(1 if on_node[j] > 0 else 0)
+        start_objective = value(problem.objective)
+        start_time = time() - solve_start
+    
+    # CBC log, to get the time of the first incumbent and the final gap
+    # (CBC writes it to the file only, it is printed afterwards if msg)
+    if solver is None:
+        solver = SolverOptions()
+    log_path = None
+    if resolve_backend(solver.backend) == 'cbc':
+        log_fd, log_path = tempfile.mkstemp(prefix='cbc_', suffix='.log')
+        os.close(log_fd)
+    solver_start = time()
+    try:
+        problem.solve(pulp_solver(solver.replace(msg=False) if log_path is not None else solver,
+                                  warm_start=warm_start, log_path=log_path))
+    finally:
+        if log_path is not None:
+            with open(log_path) as f:
+                log = f.read()
+            stats = cbc_log_stats(log)
+            if solver.msg:
+                print(log)
+            os.remove(log_path)
+    problem.first_incumbent_time, problem.gap = None, None
+    if log_path is not None:
+        if stats['first_incumbent_time'] is not None:
+            problem.first_incumbent_time = solver_start - solve_start + stats['first_incumbent_time']
+        problem.gap = stats['gap']
+    
     results = []
     results.append(f"Solver Status: {LpStatus[problem.status]}")
     results.append(f"Objective Value: {value(problem.objective)}")
@@ -142,13 +210,20 @@ def main(appl, infra, output_file):
 #   results.append(f"Total execution time: {time() - start_time:.4f} s")
 #   results.append(f"Problem creation time: {problem_end - problem_start:.4f} s")
     results.append(f"Solver time: {problem.solutionTime} s")
+    if start_objective is not None:
+        results.append(f"Warm start objective: {start_objective} (complete: {start_complete}, greedy time: {start_time} s)")
+    if problem.first_incumbent_time is not None:
+        results.append(f"Time to first incumbent: {problem.first_incumbent_time} s")
+    if problem.gap is not None:
+        results.append(f"Final gap: {problem.gap}")
     
     
     for var in problem.variables():
          if var.varValue ==1:
              results.append(f"{var.name} = {var.varValue}")
 
-    print_to_file(output_file, '\n'.join(results))
+    problem.report = '\n'.join(results)
+    print_to_file(output_file, problem.report)
 
 #   Output for queue simulation analysis         
     # if LpStatus[problem.status] == 'Optimal':
@@ -160,8 +235,75 @@ def main(appl, infra, output_file):
     #             f.write(f"{value(f_el_cloud)*max_el_cloud+value(f_el_edge)*max_el_edge+value(f_el_act)*max_el_act} {value(f_risk_edge)*(edge_containers*max_risk_edge)+value(f_risk_cloud)*(cloud_containers*max_risk_cloud)} {lambda_rate}"  + "\n")
 
 
+    # Structured solution (container/node indices), used to update the infrastructure
+    problem.assignment = Assignment.from_pairs(feasibility, [var.varValue or 0 for var in x_vars],
+                                               problem.status, value(problem.objective),
+                                               {'f_risk_cloud': value(f_risk_cloud), 'f_risk_edge': value(f_risk_edge),
+                                                'f_el_cloud': value(f_el_cloud), 'f_el_edge': value(f_el_edge),
+                                                'f_el_act': value(f_el_act)})
+
     return problem
 
+def matrix_main(appl, infra, output_file, model=None, builder='matrix', solver=None, warm_start=False, compare=False):
+    """Same as main, without building PuLP objects."""
+    if model is None and builder == 'node_classes':
+        model = NodeClassModel(appl, infra, cloud_containers, edge_containers, compare=compare)
+    elif model is None and builder == 'regions':
+        model = RegionDecomposition(appl, infra, cloud_containers, edge_containers, compare=compare)
+    elif model is None:
+        model = MatrixModel(appl, infra, cloud_containers, edge_containers, aggregate=(builder == 'aggregated'))
+    else:
+        model.set_containers(appl.containerList)
+    solution = model.solve(theta_risk=0.5, theta_el=0.5, options=solver, warm_start=warm_start)
+    comps = solution.components
+    
+    results = []
+    results.append(f"Solver Status: {LpStatus[solution.status]}")
+    results.append(f"Objective Value: {solution.objective}")
+    results.append(f"f_security value (norm): {solution.f_risk}")
+    results.append(f"f_security_cloud: {comps['f_risk_cloud']} ")
+    results.append(f"f_security_edge: {comps['f_risk_edge']} ")
+    results.append(f"f_electricity value (norm): {solution.f_el}")
+    results.append(f"f_electricity_cloud (norm): {comps['f_el_cloud']}")
+    results.append(f"f_electricity_edge (norm): {comps['f_el_edge']}")
+    results.append(f"f_electricity_activation (norm): {comps['f_el_act']}")
+    results.append(f"Solver time: {solution.solutionTime} s")
+    if solution.start_objective is not None:
+        results.append(f"Warm start objective: {solution.start_objective} (complete: {solution.start_complete}, greedy time: {solution.start_time} s)")
+    if solution.first_incumbent_time is not None:
+        results.append(f"Time to first incumbent: {solution.first_incumbent_time} s")
+    if solution.gap is not None:
+        results.append(f"Final gap: {solution.gap}")
+    if getattr(solution, 'approx_objective', None) is not None:
+        results.append(f"Node classes: {len(model.classes)}, compact model objective: {solution.approx_objective}")
+    if getattr(solution, 'objective_loss', None) is not None:
+        results.append(f"Exact model objective: {solution.exact_objective}")
+        results.append(f"Objective loss vs exact model: {solution.objective_loss}")
+    
+    for var in solution.variables():
+         if var.varValue ==1:
+             results.append(f"{var.name} = {var.varValue}")
+
+    solution.report = '\n'.join(results)
+    print_to_file(output_file, solution.report)
+    
+    return solution
+
+def cached_main(appl, infra, output_file, builder, model, solver, warm_start, cache, compare=False):
+    """main, with the results stored in the cache by content of the containers and nodes."""
+    key = cache.key('ilp_solver', files=[os.path.abspath(__file__), matrix_model.__file__],
+                    digests=[state_digest(appl.containerList, infra.nodeList)],
+                    builder=builder if model is None else type(model).__name__,
+                    solver=(solver or SolverOptions()).result_settings(), warm_start=warm_start, compare=compare,
+                    cloud_containers=cloud_containers, edge_containers=edge_containers)
+    record = cache.get(key)
+    if record is None:
+        solution = main(appl, infra, output_file, builder, model, solver, warm_start, compare=compare)
+        cache.put(key, CachedSolution.record(solution), kind='ilp_solver')
+        return solution
+    print_to_file(output_file, record['report'])
+    return CachedSolution(record, appl.containerList, infra.nodeList)
+
 if __name__ == "__main__":
     infra_file, appl_file, case_dir = configuration(cloud_nodes, edge_nodes, cloud_containers, edge_containers, selected_regions, user_region)
     output_file = f"../data/output/{case_dir}/Ncloud_{cloud_nodes}_Nedge_{edge_nodes}_E{selected_regions}_Pcloud_{cloud_containers}_Pedge_{edge_containers}_user{user_region}.txt"
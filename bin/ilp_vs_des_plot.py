@@ -14,13 +14,27 @@ sys.path.append(modules_dir)
 
 from pareto_front import *
 
-risks_ilp = pareto_results[:,1] 
-costs_ilp = pareto_results[:,2]
-risks = np.array(risks)
-energy_costs = np.array(energy_costs)
+# ILP and DES points paired by their theta_risk (the adaptive sweeps choose their own weights):
+# the ILP points missing at the weights of the DES sweep are solved, or read from the cache
+ilp_points = {round(float(theta), 12): (f_risk, f_el) for theta, f_risk, f_el in pareto_results}
+pairs = []
+for res in results:
+    theta = round(float(res['theta_risk']), 12)
+    if theta not in ilp_points:
+        ilp_points[theta] = tuple(solve_point(theta)[1][:2])
+    f_risk, f_el = ilp_points[theta]
+    if f_risk is not None and f_el is not None:
+        pairs.append((theta, res['total_risk'], res['total_energy_cost'], f_risk, f_el))
+if not pairs:
+    sys.exit("No theta_risk with both an ILP solution and a complete DES run: nothing to compare")
+pairs = np.array(sorted(pairs))
+thetas, risks, energy_costs, risks_ilp, costs_ilp = pairs.T
 plt.figure(figsize=(10,6))
-plt.plot(risks_ilp, costs_ilp, marker='.', linestyle='dashed', label="Pareto Front ILP", alpha= 0.8)
-plt.plot(risks, energy_costs, marker='o', linestyle='-', label = "Pareto Front GA", alpha= 0.8)
+# Non-dominated points only
+front_ilp = pareto_archive.points()
+front_des = des_archive.points()
+plt.plot(front_ilp[:,0], front_ilp[:,1], marker='.', linestyle='dashed', label="Pareto Front ILP", alpha= 0.8)
+plt.plot(front_des[:,0], front_des[:,1], marker='o', linestyle='-', label = "Pareto Front GA", alpha= 0.8)
 # for i, (cost, risk) in enumerate(zip(energy_costs, risks)):
 #     plt.annotate(f"({theta_values[i][0]:.1f},{theta_values[i][1]:.1f})", (risk, cost))
 
@@ -44,17 +58,17 @@ plt.show()
 
 # fig, ax = plt.subplots(figsize=(10,6))
 
-# ax.plot(weights, risks_ilp, label=r'$f_{sec}^{ILP}$', linestyle='dashed')
-# ax.plot(weights, risks, label = r'$f_{sec}^{des}$')
-# ax.plot(weights, risks-risks_ilp, label = r'$\Delta_{sec}$')
-# ax.plot(weights, energy_costs-costs_ilp, label = r'$\Delta_{el}$')
+# ax.plot(thetas, risks_ilp, label=r'$f_{sec}^{ILP}$', linestyle='dashed')
+# ax.plot(thetas, risks, label = r'$f_{sec}^{des}$')
+# ax.plot(thetas, risks-risks_ilp, label = r'$\Delta_{sec}$')
+# ax.plot(thetas, energy_costs-costs_ilp, label = r'$\Delta_{el}$')
 
 
-# ax.plot(weights, weights*risks_ilp+(1-weights)*costs_ilp, label=r'$f\left(\{X\}\right)$', linestyle='dashed')
-# ax.plot(weights, weights*risks+(1-weights)*energy_costs, label = r'$f^{des}\left(\{X\}\right)$')
-# ax.plot(weights, (risks+energy_costs)-(risks_ilp+costs_ilp), label=r'$\Delta_{el}+\Delta_{sec}$', linestyle='dotted')
-# ax.plot(weights, costs_ilp, label= r'$f_{el}^{ILP}$', linestyle='dashed')
-# ax.plot(weights, energy_costs, label = r'$f_{el}^{des}$')
+# ax.plot(thetas, thetas*risks_ilp+(1-thetas)*costs_ilp, label=r'$f\left(\{X\}\right)$', linestyle='dashed')
+# ax.plot(thetas, thetas*risks+(1-thetas)*energy_costs, label = r'$f^{des}\left(\{X\}\right)$')
+# ax.plot(thetas, (risks+energy_costs)-(risks_ilp+costs_ilp), label=r'$\Delta_{el}+\Delta_{sec}$', linestyle='dotted')
+# ax.plot(thetas, costs_ilp, label= r'$f_{el}^{ILP}$', linestyle='dashed')
+# ax.plot(thetas, energy_costs, label = r'$f_{el}^{des}$')
 
 # ax.set_xlabel(r'$\theta_{sec}$', fontsize=18)
 
@@ -70,8 +84,8 @@ plt.show()
 ##########################################################################
 import numpy as np
 
-risks_des, risks_ilp = weights*np.array(risks), weights*np.array(risks_ilp)
-costs_des, costs_ilp = (1-weights)*np.array(energy_costs), (1-weights)*np.array(costs_ilp)
+risks_des, risks_ilp = thetas*risks, thetas*risks_ilp
+costs_des, costs_ilp = (1-thetas)*energy_costs, (1-thetas)*costs_ilp
 
 # 1) Risk improvements
 delta_r   = risks_des - risks_ilp
@@ -111,20 +125,18 @@ print(f"Avg % cost impr.: {avg_pct_cost:.2f}%")
 print(f"Avg Euclid impr.:  {avg_euc:.4f}%")
 print(f"Max Euclid impr.:  {max_euc:.4f}%")
 
-from pymoo.indicators.hv import HV
+from hypervolume import front_hypervolume, box_volumes, reference_point
 
 # 2C) Hypervolume joint (re‑compute with reference point)
 des = np.column_stack((risks_des, costs_des))
 ilp = np.column_stack((risks_ilp, costs_ilp))
 
-# Reference point requested:
-max_risk= max(max(risks_ilp), max(risks_des))
-max_cost= max(max(costs_ilp), max(costs_des))
-ref_point = np.array([max_risk+max_risk*0.1, max_cost+max_cost*0.1])
-hv = HV(ref_point=ref_point)
+# Reference point requested: 10% above the worst values of both fronts
+ref_point = reference_point(ilp, des, margin=0.1)
 
-hv_des = hv(des)
-hv_ilp = hv(ilp)
+# Total hypervolume and contribution of every point, one sort per front
+hv_des, hv_des_contrib = front_hypervolume(des, ref_point)
+hv_ilp, hv_ilp_contrib = front_hypervolume(ilp, ref_point)
 
 print(f"Reference point: {ref_point}")
 print(f"HV(des) = {hv_des:.6f}")
@@ -135,15 +147,16 @@ print(f"ΔHV = {hv_ilp - hv_des:.6f} ({100*(hv_ilp-hv_des)/hv_des:.2f} % improve
 # Check the quality of the reference point
 ##############################################################################
 
-hv_des_values = [hv(des[i]) for i in range(len(des))]
-hv_ilp_values = [hv(ilp[i]) for i in range(len(ilp))]
+hv_des_values = box_volumes(des, ref_point)
+hv_ilp_values = box_volumes(ilp, ref_point)
 
-# --- contributions: hv(full) - hv(full without point i) ---
-hv_des_without_i = np.array([ hv(np.delete(des, i, axis=0)) for i in range(len(des)) ])
-hv_ilp_without_i = np.array([ hv(np.delete(ilp, i, axis=0)) for i in range(len(ilp)) ])
-
-hv_des_contrib = hv_des - hv_des_without_i
-hv_ilp_contrib = hv_ilp - hv_ilp_without_i
+# Cross-check of the totals with pymoo, if installed
+try:
+    from pymoo.indicators.hv import HV
+    hv = HV(ref_point=ref_point)
+    assert np.isclose(hv(des), hv_des) and np.isclose(hv(ilp), hv_ilp)
+except ImportError:
+    pass
 
 # Print results
 print("\nPer-point: hv(single)    contribution (hv_full - hv_without_i)")
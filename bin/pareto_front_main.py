@@ -17,6 +17,14 @@ modules_dir = os.path.join(BASEDIR, '../modules')
 sys.path.append(modules_dir)
 
 from parsing_xml import *
+from feasibility import FeasibilityIndex
+from solver_backend import SolverOptions
+import pareto_model
+from pareto_model import ParetoModel
+from pareto_sweep import sweep
+from pareto_refine import refine_front
+from pareto_archive import ParetoArchive
+from result_cache import ResultCache
 from parameters import *
 from writing_output import *
 from xml_generator import configuration
@@ -29,83 +37,46 @@ appl = Application(os.path.join(BASEDIR, '../data/input', case_dir, appl_file))
 infra = Infrastructure(os.path.join(BASEDIR, '../data/input', case_dir, infra_file))
 
 # Precompute valid (container, node) pairs
-valid_pairs = {}
-for container in appl.containerList:
-    for container in appl.containerList:
-        valid_nodes = [node for node in infra.nodeList if container.nodeType == node.type 
-                       and node.risk <= container.risk 
-                       and (container.region == 0 or container.region == node.region)
-                       and (node.activation == 0 or container.nodeType == 'cloud-cpu')]
-        valid_pairs[container] = valid_nodes
+feasibility = FeasibilityIndex(appl.containerList, infra.nodeList)
+valid_pairs = feasibility.valid_pairs()
+
+# Solver settings of each point (the threads are split among the worker processes)
+solver = SolverOptions()
+# Parametric model of solve_ilp, built at the first call
+model = None
+
+def parametric_model():
+    global model
+    if model is None:
+        model = ParetoModel(appl, infra, feasibility, cloud_containers, edge_containers)
+    return model
+
+# Points solved by earlier runs on the same inputs are read from the result cache
+use_cache = True
+cache = ResultCache() if use_cache else None
+
+def point_key(theta_risk, theta_el):
+    return cache.key('pareto_ilp', files=[infra.xml_file, appl.xml_file, pareto_model.__file__],
+                     theta_risk=float(theta_risk), theta_el=float(theta_el), solver=solver.result_settings(),
+                     cloud_containers=cloud_containers, edge_containers=edge_containers)
+
+def solve_point(theta_risk, theta_el=None):
+    """(status, values) of the weights (theta_el = 1 - theta_risk by default), from the cache if available."""
+    if theta_el is None:
+        theta_el = 1 - theta_risk
+    if cache is None:
+        return parametric_model().solve(theta_risk, theta_el, solver)
+    return cache.cached(point_key(theta_risk, theta_el), lambda: parametric_model().solve(theta_risk, theta_el, solver),
+                        kind='pareto_ilp')
 
 def solve_ilp(theta_risk, theta_el):
     """
-    Build and solve the ILP with a weighted sum objective defined by theta_risk and theta_el.
+    Solve the ILP with a weighted sum objective defined by theta_risk and theta_el.
     Returns the normalized risk and electricity cost values.
     """
-    # Create a new ILP problem instance
-    problem = LpProblem("Container_Node_Assignment", LpMinimize)
-    
-    # Define decision variables
-    decision_vars = { (container, node): LpVariable(f'X_{container.id}_{node.id}', cat='Binary')
-                      for container, nodes in valid_pairs.items() for node in nodes }
-    node_usage = { node: LpVariable(f'Y_{node.id}', cat='Binary') for node in infra.nodeList }
-    
-    # Constraints: ensure each container is assigned to exactly one node
-    for container in appl.containerList:
-        problem += lpSum(decision_vars[(container, node)] for node in valid_pairs[container]) == 1, f"unicity_{container.id}"
-    
-    # Node capacity constraints (CPU and memory) and node usage constraints
-    for node in infra.nodeList:
-        valid_containers = [container for container in appl.containerList if (container, node) in decision_vars]
-        problem += lpSum(decision_vars[(container, node)] * container.Ncore for container in valid_containers) <= node.Ncore, f"CPU_{node.id}"
-        problem += lpSum(decision_vars[(container, node)] * container.mainMemory for container in valid_containers) <= node.mainMemory, f"memory_{node.id}"
-        problem += lpSum(decision_vars[(container, node)] for container in valid_containers) <= node_usage[node] * len(valid_containers), f"NodeUsage_{node.id}"
-        problem += lpSum(decision_vars[(container, node)] for container in valid_containers) >= node_usage[node], f"NodeUsage2_{node.id}"
-    
-    
-    # Objective Function
-    risk_terms_edge = [decision_vars[(container, node)] * node.risk for container, node in decision_vars if node.type == 'edge-cpu']
-    risk_terms_cloud = [decision_vars[(container, node)] * node.risk for container, node in decision_vars if node.type == 'cloud-cpu']
-    
-    el_terms_edge = [decision_vars[(container, node)] * (node.power/1000 * node.eprice * container.Ncore / node.Ncore) for container, node in decision_vars if node.type == 'edge-cpu']
-    el_terms_cloud = [decision_vars[(container, node)] * 0.5*(node.power/1000 * node.eprice * container.Ncore / node.Ncore) for container, node in decision_vars if node.type == 'cloud-cpu']
-    el_terms_act = [node_usage[node] * node.power / 1000 * node.eprice * 0.5 for node in infra.nodeList if node.type == 'cloud-cpu']
-    
-    max_el_cloud = sum(infra.power_consumption()[0]/1000 * 0.5*infra.max_eprice()*container.Ncore/128 for container in appl.containerList if container.nodeType == 'cloud-cpu')
-    max_el_edge  = sum(infra.power_consumption()[1]/1000 * infra.max_eprice()  for container in appl.containerList if container.nodeType == 'edge-cpu')
-    max_el_act  = sum(node.power/1000 * infra.max_eprice()*0.5 for node in infra.nodeList if node.type == 'cloud-cpu')
-    
-    min_el_cloud = sum(infra.power_consumption()[0]/1000 * 0.5*infra.min_eprice()*container.Ncore/128 for container in appl.containerList if container.nodeType == 'cloud-cpu')
-    min_el_edge  = sum(infra.power_consumption()[1]/1000 * infra.min_eprice()  for container in appl.containerList if container.nodeType == 'edge-cpu')
-    min_el_act  = sum(node.power/1000 * infra.min_eprice()*0.5 for node in infra.nodeList if node.type == 'cloud-cpu')
-    
-    
-    max_risk_cloud = infra.max_risk()[0]
-    max_risk_edge = infra.max_risk()[1]
-    
-    min_risk_cloud = infra.min_risk()[0]
-    min_risk_edge = infra.min_risk()[1]
-    
-    f_risk_edge = (lpSum(risk_terms_edge)) / (edge_containers*max_risk_edge)
-    f_risk_cloud = lpSum(risk_terms_cloud) / (cloud_containers*max_risk_cloud)
-    
-    f_risk = (f_risk_cloud+f_risk_edge)/2
-    
-    f_el_edge = (lpSum(el_terms_edge)) / (max_el_edge)
-    f_el_cloud = (lpSum(el_terms_cloud)) / (max_el_cloud)
-    f_el_act = (lpSum(el_terms_act)) / (max_el_act)
-    
-    f_el = (f_el_cloud + f_el_edge+f_el_act)/3
-    
-    # Objective: weighted sum of the two normalized functions.
-    problem +=  theta_el * f_el + theta_risk * f_risk , "Weighted_Objective"
-    
-    # Solve the problem 
-    problem.solve()
-    print(LpStatus[problem.status])
-    # Return the obtained normalized objective values (if infeasible, they will be None)
-    return value(f_risk), value(f_el), value(f_risk_edge), value(f_el_edge), value(f_risk_cloud), value(f_el_cloud)
+    status, values = solve_point(theta_risk, theta_el)
+    print(LpStatus[status])
+    return values
 
 # --------------------------
 # Generate Pareto Front
@@ -115,19 +86,46 @@ pareto_results = []
 pareto_cloud = []
 pareto_edge = []
 
+# Non-dominated points of the front, saved for later runs
+archive_file = os.path.join(BASEDIR, '../data/output', case_dir, f'pareto_ILP_Ncloud_{cloud_nodes}_Nedge_{edge_nodes}_E{selected_regions}_Pcloud_{cloud_containers}_Pedge_{edge_containers}_user{user_region}.pkl')
+merge_runs = False # start from the points saved by the earlier runs
+pareto_archive = ParetoArchive.load(archive_file) if merge_runs else ParetoArchive()
+
 # Sweep over weight values between 0 and 1. (For equal granularity, you can adjust num_points.)
 num_points = 10
+adaptive = True # refine the front where it is coarsest (num_points solves at most) instead of a fixed grid
+processes = None # worker processes of the fixed grid (default: one per core, at most num_points)
 weights = np.linspace(0, 1, num_points)
-for w in weights:
-    theta_risk = w
-    theta_el = 1 - w
-    # Solve the ILP for this weight combination
-    f_risk_val, f_el_val, f_risk_edge, f_el_edge, f_risk_cloud, f_el_cloud = solve_ilp(theta_risk, theta_el)
+
+def objectives(result):
+    f_risk_val, f_el_val = result[1][:2]
+    return None if f_risk_val is None or f_el_val is None else (f_risk_val, f_el_val)
+
+if adaptive:
+    # Sequential solves on the parametric model, using all the cores
+    solver = solver.replace(threads=os.cpu_count())
+    front = [(theta_risk, status, values) for theta_risk, (status, values) in
+             refine_front(solve_point, objectives, max_solves=num_points)]
+else:
+    # Solve the missing weight combinations in parallel, results come back in order
+    cached = {w: cache.get(point_key(w, 1 - w)) for w in weights} if cache is not None else {}
+    missing = [w for w in weights if cached.get(w) is None]
+    for theta_risk, status, values in sweep(appl, infra, missing, cloud_containers, edge_containers, solver, processes):
+        cached[theta_risk] = (status, values)
+        if cache is not None:
+            cache.put(point_key(theta_risk, 1 - theta_risk), (status, values), kind='pareto_ilp')
+    front = [(float(w), *cached[w]) for w in weights]
+
+for theta_risk, status, values in front:
+    theta_el = 1 - theta_risk
+    f_risk_val, f_el_val, f_risk_edge, f_el_edge, f_risk_cloud, f_el_cloud = values
+    print(LpStatus[status])
     print(f_el_val, f_risk_val, theta_risk, theta_el)
     if f_risk_val is not None and f_el_val is not None:
         pareto_results.append((theta_risk, f_risk_val, f_el_val))
         pareto_cloud.append((theta_risk, f_risk_cloud, f_el_cloud))
         pareto_edge.append((theta_risk, f_risk_edge, f_el_edge))
+        pareto_archive.add(f_risk_val, f_el_val, (theta_risk, values))
         
     else:
         print(f"Problem infeasible for weights: risk {theta_risk}, electricity {theta_el}")
@@ -135,6 +133,7 @@ for w in weights:
 pareto_results = np.array(pareto_results)
 pareto_cloud = np.array(pareto_cloud)
 pareto_edge = np.array(pareto_edge)
+pareto_archive.save(archive_file)
 
 
 #print("Pareto Results (theta_risk, normalized risk, normalized electricity cost):")
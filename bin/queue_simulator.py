@@ -13,6 +13,10 @@ import sys
 
 import ilp_solver
 from parsing_xml import *
+from matrix_model import IncrementalModel
+from solver_backend import SolverOptions
+from result_cache import ResultCache
+from sim_trace import configure, tracer, DEBUG, INFO
 from infrastructure_to_xml import infrastructure_to_xml
 from parameters import *
 
@@ -53,6 +57,14 @@ appl = Application(os.path.join(BASEDIR, '../data/input', case_dir, appl_file))
 # --------------------------------------------------------------------------
 
 b = 12 #batch size
+builder = 'pulp' # ILP model builder: 'pulp' (PuLP expressions), 'matrix' (sparse arrays), 'aggregated' (interchangeable pods grouped), 'node_classes' (similar nodes grouped), 'regions' (regions solved in parallel) or 'incremental' (one HiGHS model kept alive and updated in place across cycles, needs highspy)
+solver = SolverOptions(backend='cbc', gap=None, time_limit=None) # e.g. gap=0.01, time_limit=5 to bound the scheduling latency
+cache = None # ResultCache() to reuse the solves of identical batches from earlier runs
+warm_start = False # greedy assignment given to the solver as MIP start (incumbent available from the start with a time limit)
+compare = False # builders 'node_classes' and 'regions': also solve the exact model and report the objective loss
+trace_level = 'info' # progress of the cycles (see sim_trace.py): 'debug' also lists the rollout variables, active and emptied nodes, 'warning' is quiet
+trace_file = None # NDJSON file of the events, e.g. f"../data/output/{case_dir}/queue_trace.ndjson"
+configure(trace_level, trace_file, echo=True)
 
 allocations = [] # List to keep track of the pods currently running on the infrastructure
 trimmed_list = [] # List to keep track of unresolved requests
@@ -63,6 +75,9 @@ min_excluded = 0
 rng = np.random.default_rng(seed=42)
 rollout = True
 
+# Scheduling model kept alive across the cycles
+model = IncrementalModel(infra, cloud_containers, edge_containers) if builder == 'incremental' else None
+
 # --------------------------------------------------------------------------
 # Solving the initial rollout
 # --------------------------------------------------------------------------
@@ -70,35 +85,29 @@ if rollout == True:
     #Create initial rollout with 6 cloud pods and 2 edge pods 
     rollout_edge_pods= 2
     rollout_cloud_pods= 6
-    print( 'Creating initial rollout...\n')
+    tracer.emit(INFO, 'rollout', sim_time, message='Creating initial rollout...\n')
     create_application_xml(rollout_cloud_pods, rollout_edge_pods, user_region, f'Rollout_Pcloud_{rollout_cloud_pods}_Pedge_{rollout_edge_pods}_E[{user_region}].xml', configurations[2])
     rollout_appl = Application(os.path.join(BASEDIR, '../data/input', case_dir, f'Rollout_Pcloud_{rollout_cloud_pods}_Pedge_{rollout_edge_pods}_E[{user_region}].xml'))
     
-    problem = ilp_solver.main(rollout_appl, infra, output_file)
-    print(problem.status)
-    for var in problem.variables():
-            if var.varValue ==1:
-                print(f"{var.name} = {var.varValue}")
+    problem = ilp_solver.main(rollout_appl, infra, output_file, builder=builder, model=model, solver=solver, warm_start=warm_start, cache=cache, compare=compare)
+    tracer.emit(INFO, 'status', sim_time, status=problem.status, message=str(problem.status))
+    if tracer.level <= DEBUG:
+        for var in problem.variables():
+                if var.varValue ==1:
+                    tracer.emit(DEBUG, 'variable', sim_time, message=f"{var.name} = {var.varValue}")
     
-    print('Generating initial conditions...')        
+    tracer.emit(INFO, 'initial_conditions', sim_time, message='Generating initial conditions...')
     
     # Activate nodes and update available resources
-    for var in problem.variables():
-        if var.name.startswith('X_') and var.varValue ==1:
-            node_id= int(var.name.split('_')[2])
-            container_id = int(var.name.split('_')[1])
-            infra.set_node_activation(node_id, 1)
-            
-            for container in rollout_appl.containerList:
-                if container.id == container_id:
-                    infra.update_node_resources(node_id,container.Ncore, container.mainMemory)
-                    for node in infra.nodeList:
-                        if node.id == node_id:
-                            allocations.append((container, node, 0))
+    assignment = problem.assignment
+    infra.apply_assignment(assignment.node_ids(), assignment.cpu, assignment.memory, activation=1)
+    allocations.extend((container, node, 0) for container, node in assignment.pairs())
     
-    for node in infra.nodeList:
-        if node.activation == 1:
-            print('id:', node.id, node.type, 'activation:', node.activation, 'region:', node.region, node.mainMemory, node.Ncore)
+    if tracer.level <= DEBUG:
+        for node in infra.nodeList:
+            if node.activation == 1:
+                tracer.emit(DEBUG, 'active_node', sim_time, node=node.id,
+                            message=f'id: {node.id} {node.type} activation: {node.activation} region: {node.region} {node.mainMemory} {node.Ncore}')
     infrastructure_to_xml(infra, f"../data/input/{case_dir}/Rollout_{infra_file}")
 
 
@@ -107,7 +116,7 @@ if rollout == True:
 # --------------------------------------------------------------------------
 
 while sim_time < simulation_time:
-    print(f'Simulation Time:{sim_time} hr')
+    tracer.emit(INFO, 'cycle', sim_time, cycle=cycle, message=f'Simulation Time:{sim_time} hr')
     # This simulates the collecting time 
 
 # --------------------------------------------------------------------------
@@ -122,8 +131,8 @@ while sim_time < simulation_time:
             infra.update_node_resources(allocation[1].id, -allocation[0].Ncore, -allocation[0].mainMemory)
             if 'edge' in allocation[1].type or allocation[1].mainMemory == 128:
                 infra.set_node_activation(allocation[1].id, 0)
-            if allocation[1].mainMemory == 128:
-                print(f'the cloud node {allocation[1].id} is empty')
+            if allocation[1].mainMemory == 128 and tracer.level <= DEBUG:
+                tracer.emit(DEBUG, 'node_empty', sim_time, node=allocation[1].id, message=f'the cloud node {allocation[1].id} is empty')
 
             allocations.pop(index)
                
@@ -143,36 +152,38 @@ while sim_time < simulation_time:
 
     num_requests_total = appl.count_requests()
 
-    print(f'{num_requests} request arrived. In total {num_requests_total} requests to serve')
+    tracer.emit(INFO, 'batch', sim_time, requests=num_requests_total,
+                message=f'{num_requests} request arrived. In total {num_requests_total} requests to serve')
 
     if num_requests_total == 0:
-        print('No requests to serve...continue')
+        tracer.emit(INFO, 'idle', sim_time, message='No requests to serve...continue')
         sim_time = window_end
         continue
     
     # When the window is closed the batch is sent to the scheduler
-    print('closing window :', window_end)
+    tracer.emit(INFO, 'window', window_end, message=f'closing window : {window_end}')
     
 
 # --------------------------------------------------------------------------
 # Solve the ILP problem
 # --------------------------------------------------------------------------
     
-    print('solving ILP problem...') 
+    tracer.emit(INFO, 'solve', window_end, message='solving ILP problem...')
     service_start = window_end       
-    problem = ilp_solver.main(appl, infra, output_file)
+    problem = ilp_solver.main(appl, infra, output_file, builder=builder, model=model, solver=solver, warm_start=warm_start, cache=cache, compare=compare)
     solver_status = problem.status
     
-    print(f'Checking feasibility of the solution...status= {solver_status}')
+    tracer.emit(INFO, 'status', window_end, status=solver_status, message=f'Checking feasibility of the solution...status= {solver_status}')
     
     
     trimmed_list = []
     while solver_status == -1:
         excluded_containers, min_excluded = appl.trim_last_requests(b)
         trimmed_list.extend(excluded_containers)
-        print(f"{len(trimmed_list)} containers removed from the ILP and moved to next cycle")
+        tracer.emit(INFO, 'trim', window_end, containers=len(trimmed_list),
+                    message=f"{len(trimmed_list)} containers removed from the ILP and moved to next cycle")
         
-        problem = ilp_solver.main(appl, infra, output_file)
+        problem = ilp_solver.main(appl, infra, output_file, builder=builder, model=model, solver=solver, warm_start=warm_start, cache=cache, compare=compare)
         solver_status = problem.status
 
 # --------------------------------------------------------------------------
@@ -181,30 +192,22 @@ while sim_time < simulation_time:
     solver_time = problem.solutionTime/3600 #[hours]
     service_end = service_start+solver_time
     service_time = service_end-service_start
-    print(f"Optimal solution found: solver took {solver_time*3600:.2f}s")
-    print(f"Service time = {service_time} hr")
+    tracer.emit(INFO, 'solution', window_end, solver_time=solver_time*3600,
+                message=f"Optimal solution found: solver took {solver_time*3600:.2f}s")
+    tracer.emit(INFO, 'service', window_end, service_time=service_time, message=f"Service time = {service_time} hr")
 
     # Update simulation time    
     sim_time = window_end + solver_time
-    print('sim_time_after_ilp', sim_time)
+    tracer.emit(INFO, 'sim_time', sim_time, message=f'sim_time_after_ilp {sim_time}')
 
     allocation_time = sim_time
 
-    print('Updating nodes availability...')        
+    tracer.emit(INFO, 'update', sim_time, message='Updating nodes availability...')
     
 
-    for var in problem.variables():
-        if var.name.startswith('X_') and var.varValue ==1:
-            node_id= int(var.name.split('_')[2])
-            container_id = int(var.name.split('_')[1])
-            infra.set_node_activation(node_id, 1)
-            
-            for container in appl.containerList:
-                if container.id == container_id:
-                    infra.update_node_resources(node_id,container.Ncore, container.mainMemory)
-                    for node in infra.nodeList:
-                        if node.id == node_id:
-                            allocations.append((container, node, allocation_time))
+    assignment = problem.assignment
+    infra.apply_assignment(assignment.node_ids(), assignment.cpu, assignment.memory, activation=1)
+    allocations.extend((container, node, allocation_time) for container, node in assignment.pairs())
 
     # Update allocation list                
     for index, allocation in enumerate(allocations):
@@ -215,8 +218,8 @@ while sim_time < simulation_time:
             infra.update_node_resources(allocation[1].id, -allocation[0].Ncore, -allocation[0].mainMemory)
             if 'edge' in allocation[1].type or allocation[1].mainMemory == 128:
                 infra.set_node_activation(allocation[1].id, 0)
-            if allocation[1].mainMemory == 128:
-                print(f'the cloud node {allocation[1].id} is empty')
+            if allocation[1].mainMemory == 128 and tracer.level <= DEBUG:
+                tracer.emit(DEBUG, 'node_empty', sim_time, node=allocation[1].id, message=f'the cloud node {allocation[1].id} is empty')
 
             allocations.pop(index)
     cycle += 1
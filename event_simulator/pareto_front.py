@@ -4,8 +4,13 @@ Discrete Event Simulation that generates a Pareto front curve.
 """
 import xml.etree.ElementTree as ET
 import simpy
+import heapq
+import multiprocessing
 import os
 import sys
+from bisect import bisect_left, insort
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from time import time
 import numpy as np
 import matplotlib.pyplot as plt
@@ -21,6 +26,10 @@ from parameters import *
 from parsing_xml import *
 from writing_output import *
 from xml_generator import configuration
+from pareto_refine import refine_front
+from pareto_archive import ParetoArchive
+from result_cache import ResultCache
+from utilization_monitor import UtilizationMonitor
 
 # Get configuration parameters 
 infra_file, appl_file, case_dir = configuration(cloud_nodes, edge_nodes, cloud_containers, edge_containers, selected_regions, user_region)
@@ -29,6 +38,19 @@ infra_file, appl_file, case_dir = configuration(cloud_nodes, edge_nodes, cloud_c
 appl_file = os.path.join(BASEDIR, '../data/input', case_dir, appl_file)
 infra_file = os.path.join(BASEDIR, '../data/input', case_dir, infra_file)
 
+# Utilization time series of each simulation (simpy engine, see utilization_monitor.py),
+# sampled every monitor_interval and saved next to the output file (None: not recorded)
+monitor_interval = None
+
+# Simulations run earlier on the same inputs are read from the result cache
+# (not when the utilization is recorded, the simulations are run again)
+use_cache = True
+des_cache = ResultCache() if use_cache and monitor_interval is None else None
+sim_until = 1000
+schedule_interval = 1 # simulated time between two scheduling decisions (0: no delay)
+engine = 'simpy' # 'simpy' or 'arrays' (same greedy scheduling on NumPy arrays, without SimPy processes)
+processes = None # worker processes of the weight sweep (default: one per core)
+
 output_file = f'../data/output/{case_dir}/DES_Ncloud_{cloud_nodes}_Nedge_{edge_nodes}_E{selected_regions}_Pcloud_{cloud_containers}_Pedge_{edge_containers}_user{user_region}.txt'
 overwrite_file(output_file)
 
@@ -71,10 +93,11 @@ class Pod:
         return (f"Pod({self.pod_id}, type={self.required_node_type}, "
                 f"mem={self.required_memory}, risk={self.required_risk}, region={self.required_region})")
 
-def parse_nodes(xml_file, env):
+def parse_node_records(xml_file):
+    """Attributes of the nodes, to build the Node objects of each simulation without parsing again."""
     tree = ET.parse(xml_file)
     root = tree.getroot()
-    nodes = []
+    records = []
     for node in root.findall('node'):
         node_id = node.find('id').text
         node_type = node.find('type').text
@@ -85,8 +108,14 @@ def parse_nodes(xml_file, env):
         eprice = node.find('eprice').text  
         power = node.find('power').text
         activation = node.find('activation').text
-        nodes.append(Node(env, node_id, node_type, main_memory, Ncore, risk, region, eprice, power, activation))
-    return nodes
+        records.append((node_id, node_type, main_memory, Ncore, risk, region, eprice, power, activation))
+    return records
+
+def build_nodes(records, env):
+    return [Node(env, *record) for record in records]
+
+def parse_nodes(xml_file, env):
+    return build_nodes(parse_node_records(xml_file), env)
 
 def parse_pods(xml_file):
     tree = ET.parse(xml_file)
@@ -112,39 +141,178 @@ def max_risk(nodes):
     max_edge_risk = max(node.risk for node in nodes if 'edge' in node.node_type) 
     return max_cloud_risk, max_edge_risk
 
-def scheduler(env, pod_queue, nodes):
-    global total_energy_cost, total_risk 
-    global norm_el_cloud, el_cost_cloud, el_cost_edge, activation_cost_total
-    global risk_cost_cloud, risk_cost_edge
-
+def cloud_score(risk, eprice, activation, theta_price, theta_risk, max_risk_cloud, max_price):
+    """Weighted score of cloud nodes for a cloud pod (node attributes as scalars or arrays)."""
     Ncloud_int = cloud_nodes*num_regions
-    
-    results = []
+    return (theta_risk/2 * risk/(cloud_containers*max_risk_cloud) + theta_price/3 * (eprice/(cloud_containers*max_price))
+            + theta_price/3*(1-activation)*eprice/(Ncloud_int*max_price))
+
+def edge_score(risk, eprice, theta_price, theta_risk, max_risk_edge, max_price):
+    """Weighted score of edge nodes for an edge pod."""
+    return theta_risk/2 * risk/(edge_containers*max_risk_edge) + theta_price/3 * (eprice/(edge_containers*max_price))
+
+class NodePriority:
+    """
+    Nodes of each (node type, region) ordered by their score for the pods of
+    that type. The scores depend on the weights and on static attributes of
+    the nodes, except for the activation term of the cloud nodes: the
+    orderings are built once per simulation, a node is moved when it is
+    activated and dropped when no pod fits its remaining CPU or memory.
+    Equal scores are ordered as the nodes in the infrastructure file.
+    """
+
+    def __init__(self, nodes, pods, theta_price, theta_risk):
+        self.theta_price = theta_price
+        self.theta_risk = theta_risk
+        self.max_risk_cloud, self.max_risk_edge = max_risk(nodes)
+        self.max_price = max_eprice(nodes)
+        self.min_cpu = min((pod.required_cpu for pod in pods), default=0)
+        self.min_memory = min((pod.required_memory for pod in pods), default=0)
+        self.scores = [self.score(node) for node in nodes]
+        self.listed = [True] * len(nodes)
+        self.groups = {}
+        for index, node in enumerate(nodes):
+            self.groups.setdefault((node.node_type, node.region), []).append((self.scores[index], index, node))
+        self.types = {}
+        for (node_type, region), group in self.groups.items():
+            group.sort()
+            self.types.setdefault(node_type, []).append(group)
+
+    def score(self, node):
+        """Score of the node for a pod of its type (lower is better)."""
+        if 'cloud' in node.node_type:
+            return cloud_score(node.risk, node.eprice, node.activation, self.theta_price, self.theta_risk,
+                               self.max_risk_cloud, self.max_price)
+        if 'edge' in node.node_type:
+            return edge_score(node.risk, node.eprice, self.theta_price, self.theta_risk, self.max_risk_edge, self.max_price)
+        return 0
+
+    def candidates(self, pod):
+        """(score, index, node) of the nodes of the type and region of the pod, by increasing score."""
+        if pod.required_region != 0:
+            return iter(self.groups.get((pod.required_node_type, pod.required_region), ()))
+        return heapq.merge(*self.types.get(pod.required_node_type, ()))
+
+    def update(self, index, node):
+        """Reorder the node after an allocation (activation and resources changed)."""
+        group = self.groups[(node.node_type, node.region)]
+        if self.listed[index]:
+            del group[bisect_left(group, (self.scores[index], index))]
+        self.listed[index] = node.cpu.level >= self.min_cpu and node.memory.level >= self.min_memory
+        if self.listed[index]:
+            self.scores[index] = self.score(node)
+            insort(group, (self.scores[index], index, node))
+
+class CostAccount:
+    """
+    Normalized electricity and risk costs of the placements of a simulation,
+    and the lines of its report (shared by the SimPy and the array engines).
+    """
+
+    def __init__(self, max_risk_cloud, max_risk_edge, max_price):
+        self.max_risk_cloud = max_risk_cloud
+        self.max_risk_edge = max_risk_edge
+        self.max_price = max_price
+        self.Ncloud_int = cloud_nodes*num_regions
+        self.norm_el_cloud = 0
+        self.norm_el_edge = 0
+        self.el_cost_cloud = 0
+        self.el_cost_edge = 0
+        self.risk_cost_cloud = 0
+        self.risk_cost_edge = 0
+        self.activation_cost_total = 0
+        self.activation_cost = 0
+        self.results = []
+
+    def place(self, pod, node_id, node_type, eprice, power, total_cpu, risk, activate):
+        """Costs of the pod placed on the node, activated by the placement if activate."""
+        max_price = self.max_price
+        # if node not yet activated 
+        if activate:
+            norm_activation_cost =  (self.Ncloud_int*max_price * 0.5*power / 1000)
+            activation_cost = 0.5*((eprice * power / 1000)) / norm_activation_cost
+            self.activation_cost_total += activation_cost
+        else:
+            activation_cost = 0
+        self.activation_cost = activation_cost
+
+        # Compute normalized risk and energy cost
+        if "cloud" in node_type:
+            alpha = 2
+            norm_risk = self.max_risk_cloud * cloud_containers
+            self.norm_el_cloud += (1/alpha) * (max_price * power / 1000) * pod.required_cpu / total_cpu
+            el_cost = ((eprice * power / 1000) * pod.required_cpu / total_cpu) / (alpha)
+            self.el_cost_cloud += ((eprice * power / 1000) * pod.required_cpu / total_cpu) / (alpha)
+
+            self.risk_cost_cloud += risk/norm_risk
+            
+#            print(f'Print results cloud\n X_{pod.pod_id}_{node_id} {el_cost} {risk/norm_risk}')
+            decision_var_name = f'X_{pod.pod_id}_{node_id}'
+            id_, a, b = decision_var_name.split("_")
+
+            self.results.append('Var_name, f_act(norm) f_el(cloud), f_risk(cloud, norm)')
+            self.results.append(f"{id_}_{a.split(':')[1]}_{b.split(':')[1]}, {activation_cost}, {self.el_cost_cloud} {risk/norm_risk}")
+            
+        else:
+            alpha = 1
+            norm_risk = self.max_risk_edge * edge_containers
+            self.norm_el_edge = (edge_containers/alpha) * (max_price * power / 1000) * pod.required_cpu / total_cpu
+            el_cost = ((eprice * power / 1000) * pod.required_cpu / total_cpu) / (alpha)
+            self.el_cost_edge += ((eprice * power / 1000) * pod.required_cpu / total_cpu) / (alpha)
+
+            self.risk_cost_edge += risk/norm_risk
+#            print(f'Print results edge\n X_{pod.pod_id}_{node_id} {el_cost} {risk/norm_risk}')
+
+            decision_var_name = f'X_{pod.pod_id}_{node_id}'
+            id_, a, b = decision_var_name.split("_")
+
+            self.results.append('Var_name, f_act(norm) f_el(edge) f_risk(edge_norm)')
+            self.results.append(f"{id_}_{a.split(':')[1]}_{b.split(':')[1]}, {activation_cost}, {el_cost} {risk/norm_risk}")
+
+    def metrics(self):
+        """Normalized totals and report, once all the pods are placed."""
+        #normalization
+        el_cost_cloud = self.el_cost_cloud /self.norm_el_cloud
+        el_cost_edge = self.el_cost_edge /self.norm_el_edge
+        results = self.results
+        results.append('f_el_cloud(norm) f_el_edge(norm) f_el_act(norm)')
+        results.append(f"{el_cost_cloud}, {el_cost_edge} {self.activation_cost}")
+
+        total_energy_cost = (el_cost_cloud+self.activation_cost_total+el_cost_edge) / 3  
+        total_risk = (self.risk_cost_cloud+ self.risk_cost_edge) / 2
+        
+        results.append('f_el_tot f_risk_tot')
+        results.append(f"{total_energy_cost}, {total_risk}")
+        
+        return dict(total_energy_cost=total_energy_cost, total_risk=total_risk, norm_el_cloud=self.norm_el_cloud,
+                    el_cost_cloud=el_cost_cloud, el_cost_edge=el_cost_edge, activation_cost_total=self.activation_cost_total,
+                    risk_cost_cloud=self.risk_cost_cloud, risk_cost_edge=self.risk_cost_edge, report='\n'.join(results))
+
+def scheduler(env, pod_queue, nodes, theta_price, theta_risk, metrics, interval=schedule_interval, monitor=None):
+    """
+    Greedy scheduling of the pods, one every interval of simulated time; the
+    normalized costs and the report are stored in metrics. The placed pods
+    never release their resources, so a pod without a node would never fit
+    later: it is parked for good, the remaining pods are scheduled, and no
+    metrics are stored (as when the simulation reaches its end before all
+    the pods are placed). The backlog recorded by monitor is the number of
+    pods queued or parked.
+    """
+    priority = NodePriority(nodes, pod_queue, theta_price, theta_risk)
+    pod_queue = deque(pod_queue)
+    parked = []
+    account = CostAccount(priority.max_risk_cloud, priority.max_risk_edge, priority.max_price)
+    if monitor is not None:
+        monitor.backlog = lambda: len(pod_queue) + len(parked)
+
     while pod_queue:
-        yield env.timeout(1) # scheduling interval
-        pod = pod_queue.pop(0) # submit first pod to the scheduler
+        if interval:
+            yield env.timeout(interval) # scheduling interval
+        pod = pod_queue.popleft() # submit first pod to the scheduler
         scheduled = False
-        
-        if 'cloud' in pod.required_node_type:       
-            nodes = sorted(nodes, key=lambda n: (theta_risk/2 * n.risk/(cloud_containers*max_risk(nodes)[0])+ theta_price/3 * (n.eprice/(cloud_containers*max_eprice(nodes)))+theta_price/3*(1-n.activation)*n.eprice/(Ncloud_int*max_eprice(nodes))))
-          #  nodes = sorted(nodes, key=lambda n: theta_price/3*(1-n.activation)*n.eprice/(Ncloud_int*max_eprice(nodes)))
-        elif 'edge' in pod.required_node_type:
-            nodes = sorted(nodes, key=lambda n: (theta_risk/2 * n.risk/(edge_containers*max_risk(nodes)[1]) + theta_price/3 * (n.eprice/(edge_containers*max_eprice(nodes)))))
-
-        # print(pod.pod_id)
-        # for node in nodes:
-        #       print(pod.required_node_type)
-        #       print(f'{node.node_id}, {node.eprice} {node.risk}')
-        #       print((theta_risk/2 * node.risk/(cloud_containers*max_risk(nodes)[0])+ theta_price/3 * (node.eprice/(cloud_containers*max_eprice(nodes)))), theta_price/3*(1-node.activation)*node.eprice/(Ncloud_int*max_eprice(nodes)))  
-
-
-        for node in nodes:
-            # Check node type
-            if node.node_type != pod.required_node_type:
-                continue
-            # Check region: if pod.required_region != 0, node must be in that region
-            if pod.required_region != 0 and node.region != pod.required_region:
-                continue
+
+        # Nodes of the type and region of the pod, by increasing score
+        for _, index, node in priority.candidates(pod):
             # Check risk: node's risk must be less than the pod's required risk
             if node.risk > pod.required_risk:
                 continue
@@ -152,110 +320,191 @@ def scheduler(env, pod_queue, nodes):
             if node.memory.level < pod.required_memory or node.cpu.level < pod.required_cpu:
                 continue
 
-            # if node not yet activated 
-            if node.activation == 0 and "cloud" in node.node_type:
-                norm_activation_cost =  (Ncloud_int*max_eprice(nodes) * 0.5*node.power / 1000)
-                activation_cost = 0.5*((node.eprice * node.power / 1000)) / norm_activation_cost
-                activation_cost_total += activation_cost
+            activate = node.activation == 0 and "cloud" in node.node_type
+            if activate:
                 node.activation =1
-            else:
-                activation_cost = 0
-                
-                
             
             # Allocate CPU and Memory
             yield node.cpu.get(pod.required_cpu)
             yield node.memory.get(pod.required_memory)
+            priority.update(index, node)
             scheduled = True
-            # Compute normalized risk and energy cost
-            if "cloud" in node.node_type:
-                alpha = 2
-                norm_risk = max_risk(nodes)[0] * cloud_containers
-                norm_el_cloud += (1/alpha) * (max_eprice(nodes) * node.power / 1000) * pod.required_cpu / node.total_cpu
-                el_cost = ((node.eprice * node.power / 1000) * pod.required_cpu / node.total_cpu) / (alpha)
-                el_cost_cloud += ((node.eprice * node.power / 1000) * pod.required_cpu / node.total_cpu) / (alpha)
-
-                risk_cost_cloud += node.risk/norm_risk
-                
-#                print(f'Print results cloud\n X_{pod.pod_id}_{node.node_id} {el_cost} {node.risk/norm_risk}')
-                decision_var_name = f'X_{pod.pod_id}_{node.node_id}'
-                id_, a, b = decision_var_name.split("_")
-    
-                results.append('Var_name, f_act(norm) f_el(cloud), f_risk(cloud, norm)')
-                results.append(f"{id_}_{a.split(':')[1]}_{b.split(':')[1]}, {activation_cost}, {el_cost_cloud} {node.risk/norm_risk}")
-                
-            else:
-                alpha = 1
-                norm_risk = max_risk(nodes)[1] * edge_containers
-                norm_el_edge = (edge_containers/alpha) * (max_eprice(nodes) * node.power / 1000) * pod.required_cpu / node.total_cpu
-                el_cost = ((node.eprice * node.power / 1000) * pod.required_cpu / node.total_cpu) / (alpha)
-                el_cost_edge += ((node.eprice * node.power / 1000) * pod.required_cpu / node.total_cpu) / (alpha)
-
-                risk_cost_edge += node.risk/norm_risk
-#                print(f'Print results edge\n X_{pod.pod_id}_{node.node_id} {el_cost} {node.risk/norm_risk}')
-
-                decision_var_name = f'X_{pod.pod_id}_{node.node_id}'
-                id_, a, b = decision_var_name.split("_")
-    
-                results.append('Var_name, f_act(norm) f_el(edge) f_risk(edge_norm)')
-                results.append(f"{id_}_{a.split(':')[1]}_{b.split(':')[1]}, {activation_cost}, {el_cost} {node.risk/norm_risk}")
-
-
-
+            account.place(pod, node.node_id, node.node_type, node.eprice, node.power, node.total_cpu, node.risk, activate)
             break
         if not scheduled:
-            # Re-queue the unscheduled pod
-            pod_queue.append(pod)
-    #normalization
-    el_cost_cloud = el_cost_cloud /norm_el_cloud
-    el_cost_edge = el_cost_edge /norm_el_edge
-    results.append('f_el_cloud(norm) f_el_edge(norm) f_el_act(norm)')
-    results.append(f"{el_cost_cloud}, {el_cost_edge} {activation_cost}")
-
-    
-    total_energy_cost = (el_cost_cloud+activation_cost_total+el_cost_edge) / 3  
-    total_risk = (risk_cost_cloud+ risk_cost_edge) / 2
-    
-    results.append('f_el_tot f_risk_tot')
-    results.append(f"{total_energy_cost}, {total_risk}")
-    
-    
-    print_to_file(output_file, '\n'.join(results))
+            # No resources are released later: the pod stays parked
+            parked.append(pod)
+
+    if parked:
+        # Not all the pods placed: no metrics, the monitor samples the backlog until the end
+        return
+    if monitor is not None:
+        monitor.stop()
+    metrics.update(account.metrics())
+
+def node_state(node_records):
+    """Attributes of the nodes as NumPy arrays (converted as in Node)."""
+    node_id, node_type, main_memory, Ncore, risk, region, eprice, power, activation = zip(*node_records)
+    return dict(node_id=list(node_id), node_type=np.array(node_type),
+                memory=np.array([int(value) for value in main_memory]), cpu=np.array([int(value) for value in Ncore]),
+                risk=np.array([float(value) for value in risk]), region=np.array([int(value) for value in region]),
+                eprice=np.array([float(value) for value in eprice]), power=np.array([int(value) for value in power]),
+                activation=np.array([int(value) for value in activation]))
+
+def greedy_schedule(pods, node_records, theta_price, theta_risk, until=sim_until, interval=schedule_interval):
+    """
+    The scheduling of scheduler on NumPy arrays, without SimPy: the pods are
+    taken in order and each goes to the feasible node of lowest score (the
+    first one in the file for equal scores), found by a vectorized mask and
+    argmin. Since resources are never released, a pod without a node stays
+    parked for good; as with SimPy, no metrics are returned then, or if the
+    pods take until or more.
+    """
+    state = node_state(node_records)
+    node_type, region, risk, eprice = state['node_type'], state['region'], state['risk'], state['eprice']
+    cpu, memory, activation = state['cpu'], state['memory'], state['activation']
+    total_cpu = cpu.copy()
+    cloud = np.array(['cloud' in t for t in node_type.tolist()])
+    edge = np.array(['edge' in t for t in node_type.tolist()]) & ~cloud
+    max_risk_cloud, max_risk_edge, max_price = risk[cloud].max(), risk[edge].max(), eprice.max()
+    if interval and len(pods)*interval >= until:
+        return {}
+
+    score = np.zeros(len(node_type))
+    score[cloud] = cloud_score(risk[cloud], eprice[cloud], activation[cloud], theta_price, theta_risk, max_risk_cloud, max_price)
+    score[edge] = edge_score(risk[edge], eprice[edge], theta_price, theta_risk, max_risk_edge, max_price)
+    account = CostAccount(float(max_risk_cloud), float(max_risk_edge), float(max_price))
+    # Nodes of each (node type, region) of the pods
+    nodes_of = {}
+    for pod in pods:
+        key = (pod.required_node_type, pod.required_region)
+        mask = nodes_of.get(key)
+        if mask is None:
+            mask = nodes_of[key] = (node_type == key[0]) & ((region == key[1]) if key[1] != 0 else True)
+        candidates = np.flatnonzero(mask & (risk <= pod.required_risk) & (memory >= pod.required_memory) & (cpu >= pod.required_cpu))
+        if len(candidates) == 0:
+            return {}
+        j = candidates[np.argmin(score[candidates])]
+        activate = bool(activation[j] == 0 and cloud[j])
+        if activate:
+            activation[j] = 1
+            score[j] = cloud_score(risk[j], eprice[j], activation[j], theta_price, theta_risk, max_risk_cloud, max_price)
+        cpu[j] -= pod.required_cpu
+        memory[j] -= pod.required_memory
+        account.place(pod, state['node_id'][j], node_type[j], float(eprice[j]), int(state['power'][j]), int(total_cpu[j]),
+                      float(risk[j]), activate)
+    return account.metrics()
 
 # ------------------------------------------------------------------
 # Simulation function that runs one instance for given theta values
 # ------------------------------------------------------------------
-def run_simulation(theta_price, theta_risk):
-    global total_energy_cost, total_risk
-    global norm_el_cloud, el_cost_cloud, el_cost_edge, activation_cost_total
-    global risk_cost_cloud, risk_cost_edge
-    # Reset metrics
-    total_energy_cost = 0
-    total_risk = 0
-    norm_el_cloud = 0
-    el_cost_cloud = 0
-    el_cost_edge = 0
-    risk_cost_cloud = 0
-    risk_cost_edge = 0
-    activation_cost_total = 0
-
-    # Set up a new simulation environment
-    env = simpy.Environment()
-    # Parse nodes and pods for the DES
-    pods = parse_pods(appl_file)
-    nodes = parse_nodes(infra_file, env)
-    
-    # Start the scheduler process
-    env.process(scheduler(env, pods, nodes))
-    
-    # Run simulation until time 1000 (or adjust as needed)
+def simulate(pods, node_records, theta_price, theta_risk, until=sim_until):
+    """
+    One simulation on the parsed pods and nodes (a new SimPy environment and
+    new Node objects, or new arrays, nothing shared with other runs).
+    Returns (total_energy_cost, total_risk, objective_value, solver_time) and the metrics.
+    """
+    # Values left if the simulation ends before all the pods are scheduled
+    metrics = dict(total_energy_cost=0, total_risk=0, norm_el_cloud=0, el_cost_cloud=0, el_cost_edge=0,
+                   activation_cost_total=0, risk_cost_cloud=0, risk_cost_edge=0, report=None)
     sim_start = time()
-    env.run(until=1000)
+    if engine == 'arrays':
+        metrics.update(greedy_schedule(pods, node_records, theta_price, theta_risk, until))
+    else:
+        env = simpy.Environment()
+        nodes = build_nodes(node_records, env)
+        monitor = None
+        if monitor_interval:
+            monitor = UtilizationMonitor(env, nodes, monitor_interval, cloud=['cloud' in node.node_type for node in nodes],
+                                         node_ids=[node.node_id for node in nodes], until=until)
+        # Start the scheduler process (before the monitor, which samples its backlog)
+        env.process(scheduler(env, pods, nodes, theta_price, theta_risk, metrics, monitor=monitor))
+        if monitor is not None:
+            env.process(monitor.process())
+        
+        # Run simulation until sim_until (or adjust as needed)
+        env.run(until=until)
+        if monitor is not None:
+            monitor.save(utilization_file(theta_risk))
     sim_end = time()
     
     solver_time = sim_end - sim_start
-    objective_value = theta_price*total_energy_cost + theta_risk*total_risk
-    return total_energy_cost, total_risk, objective_value, solver_time
+    objective_value = theta_price*metrics['total_energy_cost'] + theta_risk*metrics['total_risk']
+    return (metrics['total_energy_cost'], metrics['total_risk'], objective_value, solver_time), metrics
+
+def utilization_file(theta_risk):
+    return os.path.splitext(output_file)[0] + f'_utilization_theta_risk_{theta_risk:.4f}.npz'
+
+def simulation_key(theta_price, theta_risk):
+    return des_cache.key('pareto_des', files=[infra_file, appl_file, os.path.abspath(__file__)],
+                         theta_price=float(theta_price), theta_risk=float(theta_risk), until=sim_until,
+                         interval=schedule_interval, engine=engine)
+
+def run_result(run):
+    """
+    Result of a (result, metrics) run of simulate; the costs and the objective value
+    are None if the run has no report (pods parked or sim_until reached), as the ILP
+    values of an infeasible problem. The report is written to the output file.
+    """
+    result, metrics = run
+    if metrics['report'] is None:
+        return (None, None, None, result[3])
+    print_to_file(output_file, metrics['report'])
+    return result
+
+def run_simulation(theta_price, theta_risk):
+    """run_result of simulate for the given weights, from the cache if available."""
+    key = simulation_key(theta_price, theta_risk) if des_cache is not None else None
+    cached = des_cache.get(key) if key is not None else None
+    if cached is None:
+        cached = simulate(pods, node_records, theta_price, theta_risk)
+        if key is not None:
+            des_cache.put(key, cached, kind='pareto_des')
+    return run_result(cached)
+
+# Point of the parallel sweep: pods and node_records are inherited from the parent (fork)
+def _simulate_point(theta_risk):
+    return simulate(pods, node_records, 1 - theta_risk, theta_risk)
+
+def run_simulations(weights, processes=None):
+    """
+    run_simulation for every theta_risk in weights (theta_price = 1 - theta_risk),
+    the missing points solved in parallel (one process per core by default).
+    """
+    weights = [float(w) for w in weights]
+    runs = {}
+    keys = {}
+    if des_cache is not None:
+        for w in weights:
+            keys[w] = simulation_key(1 - w, w)
+            cached = des_cache.get(keys[w])
+            if cached is not None:
+                runs[w] = cached
+    missing = [w for w in weights if w not in runs]
+    if missing:
+        # The workers are forked to inherit the parsed pods and nodes
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = max(1, min(processes, len(missing)))
+        if processes == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            computed = map(_simulate_point, missing)
+            for w, run in zip(missing, computed):
+                runs[w] = run
+        else:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork')) as pool:
+                for w, run in zip(missing, pool.map(_simulate_point, missing)):
+                    runs[w] = run
+        if des_cache is not None:
+            for w in missing:
+                des_cache.put(keys[w], runs[w], kind='pareto_des')
+    front = []
+    for w in weights:
+        front.append((w, run_result(runs[w])))
+    return front
+
+# Pods and nodes parsed once for all the simulations
+pods = parse_pods(appl_file)
+node_records = parse_node_records(infra_file)
 
 # ------------------------------------------------------------------
 # Loop over theta values and collect simulation results
@@ -265,14 +514,37 @@ theta_values = []
 energy_costs = []
 risks = []
 
+# Non-dominated points of the front, saved for later runs
+archive_file = os.path.splitext(output_file)[0] + '.pkl'
+merge_runs = False # start from the points saved by the earlier runs
+des_archive = ParetoArchive.load(archive_file) if merge_runs else ParetoArchive()
+
 # Create 'num_points' pairs for theta
 num_points = 10
+adaptive = True # refine the front where it is coarsest (num_points simulations at most) instead of a fixed grid
 weights = np.linspace(0, 1, num_points)
-for w in weights:
+
+def objectives(result):
+    cost, risk = result[:2]
+    return None if cost is None or risk is None else (risk, cost)
+
+if adaptive:
+    # The DES objectives are not the weighted functions: split the weight intervals in the middle.
+    # The points of each round (one per process) are simulated in parallel
+    front = refine_front(lambda w: run_simulation(1 - w, w), objectives,
+                         max_solves=num_points, split='midpoint',
+                         evaluate_many=lambda ws: [result for _, result in run_simulations(ws, processes)],
+                         round_size=processes or os.cpu_count() or 1)
+else:
+    # All the weights at once, in parallel
+    front = run_simulations(weights, processes)
+for w, (cost, risk, obj_val, solver_time) in front:
     theta_risk = w
     theta_price = 1 - w
+    if objectives((cost, risk)) is None:
+        print(f"No complete schedule for weights: price {theta_price}, risk {theta_risk}")
+        continue
     #print(f"Running simulation for theta_price={theta_price:.1f}, theta_risk={theta_risk:.1f} ...")
-    cost, risk, obj_val, solver_time = run_simulation(theta_price, theta_risk)
     results.append({
         'theta_price': theta_price,
         'theta_risk': theta_risk,
@@ -284,6 +556,8 @@ for w in weights:
     theta_values.append((theta_price, theta_risk))
     energy_costs.append(cost)
     risks.append(risk)
+    des_archive.add(risk, cost, (theta_risk, obj_val))
+des_archive.save(archive_file)
 
 # Optionally: print the results
 for res in results:
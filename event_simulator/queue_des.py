@@ -3,6 +3,11 @@ import simpy
 import os
 import sys
 import numpy as np
+from bisect import insort
+from copy import copy
+from functools import partial
+from heapq import merge
+from itertools import count, repeat
 from time import time
 
 # -----------------------------
@@ -18,12 +23,38 @@ sys.path.append(bin_dir)
 from parsing_xml import *    
 from writing_output import * 
 from parameters import *
+from sim_trace import tracer, configure, DEBUG, INFO
+from poisson_arrivals import poisson_arrivals_in_window
+from node_risk_attribute import monte_carlo_risk_simulation, extract_random_risk_sample
+from replications import replication_seed, run_replications, summarize
+from utilization_monitor import UtilizationMonitor
 
 
 # Simulation settings
 theta_risk = 0.5                 # weight for risk
 theta_price = 0.5                # weight for electricity price
 
+# Event trace (see sim_trace.py): 'off', 'warning', 'info' (arrivals, allocations,
+# releases) or 'debug' (also the pods waiting for resources)
+trace_level = 'off'
+trace_file = None                # NDJSON file of the events, e.g. os.path.join(BASEDIR, 'Queue_des_trace.ndjson')
+trace_echo = False               # print the events
+trace_sample = 1.0               # fraction of the events recorded
+
+# Utilization time series (see utilization_monitor.py): free CPU and memory
+# of the nodes, active cloud nodes and waiting pods, sampled every interval
+monitor_interval = None          # [hour] (None: not recorded)
+monitor_file = os.path.join(BASEDIR, 'Queue_des_utilization.npz')
+
+# Replications: independent runs with new arrival times and node risks drawn
+# for each seed (0: single run of the arrival times and risks of the XML files)
+replications = 0                 # maximum number of replications
+min_replications = 5
+precision = 0.05                 # stop when the confidence intervals are within 5% of the means (None: run all)
+confidence = 0.95
+seed = 1
+processes = None                 # worker processes (default: one per core)
+
 # Deployment parameters
 Ncloud = cloud_nodes
 Ncloud_int = cloud_nodes*num_regions
@@ -64,6 +95,8 @@ class Pod:
         self.required_risk = container['risk']
         self.required_region = container['region']
         self.service_time = container['r_time']
+        self.request_id = container['request_id']
+        self.start_time = None
 
 # -----------------------------
 # XML Parsing
@@ -102,7 +135,8 @@ def parse_application_xml(xml_file):
             'risk': float(container.find('risk').text),
             'region': int(container.find('region').text),
             'r_time': float(container.find('r_time').text),
-            'arr_time': float(container.find('arr_time').text)
+            'arr_time': float(container.find('arr_time').text),
+            'request_id': int(container.find('request_id').text)
         }
         pods.append(Pod(data))
     return pods
@@ -119,6 +153,178 @@ def max_risk(nodes):
     edge_r  = max(n.risk for n in nodes if 'edge' in n.type)
     return cloud_r, edge_r
 
+
+# Normalization constants of each node list: risk and price do not change
+# during the simulation, so they are computed once per list
+_node_stats = {}
+
+def node_stats(nodes):
+    """(max cloud risk, max edge risk, max eprice) of the node list."""
+    entry = _node_stats.get(id(nodes))
+    if entry is None or entry[0] is not nodes:
+        entry = _node_stats[id(nodes)] = (nodes, (*max_risk(nodes), max_eprice(nodes)))
+    return entry[1]
+
+def node_score(node, max_risk_cloud, max_risk_edge, max_price):
+    """Cost score of the node for a pod of its type (lower is better)."""
+    if 'cloud' in node.type:
+        return (theta_risk/2 * node.risk/(cloud_containers*max_risk_cloud)+ theta_price/3 * (node.eprice/(cloud_containers*max_price))+theta_price/3*(1-node.activation)*node.eprice/(Ncloud_int*max_price))
+    if 'edge' in node.type:
+        return (theta_risk/2 * node.risk/(edge_containers*max_risk_edge) + theta_price/3 * (node.eprice/(edge_containers*max_price)))
+    return 0
+
+
+class NodeIndex:
+    """
+    Nodes of each (type, region) ordered by their cost score, which does not
+    change during the simulation, with a segment tree over that order
+    holding the largest free CPU and memory and the lowest risk of each
+    range: the cheapest node able to host a pod is found by descending the
+    tree, skipping the ranges where no node fits. Equal scores are ordered
+    as the node list. The leaves must be updated when resources are taken
+    or given back (update).
+    """
+
+    def __init__(self, nodes):
+        stats = node_stats(nodes)
+        self.groups = {}
+        for position, node in enumerate(nodes):
+            self.groups.setdefault((node.type, node.region), []).append((node_score(node, *stats), position, node))
+        self.types = {}
+        self.leaf = {}
+        for key, members in self.groups.items():
+            members.sort(key=lambda member: member[:2])
+            size = 1
+            while size < len(members):
+                size *= 2
+            cpu = [-np.inf] * (2*size)
+            memory = [-np.inf] * (2*size)
+            risk = [np.inf] * (2*size)
+            for i, (_, _, node) in enumerate(members):
+                cpu[size + i], memory[size + i], risk[size + i] = node.cpu.level, node.memory.level, node.risk
+                self.leaf[node.id] = (key, size + i)
+            for k in range(size - 1, 0, -1):
+                cpu[k] = max(cpu[2*k], cpu[2*k + 1])
+                memory[k] = max(memory[2*k], memory[2*k + 1])
+                risk[k] = min(risk[2*k], risk[2*k + 1])
+            self.groups[key] = (members, size, cpu, memory, risk)
+            self.types.setdefault(key[0], []).append(key)
+
+    def first_fit(self, pod):
+        """Cheapest node of the type and region of the pod with enough risk margin, CPU and memory, or None."""
+        if pod.required_region != 0:
+            keys = [(pod.required_nodeType, pod.required_region)] if (pod.required_nodeType, pod.required_region) in self.groups else []
+        else:
+            keys = self.types.get(pod.required_nodeType, [])
+        best = None
+        for key in keys:
+            members, size, cpu, memory, risk = self.groups[key]
+            # Leftmost fitting leaf: depth first, left child first
+            stack = [1]
+            while stack:
+                k = stack.pop()
+                if cpu[k] < pod.required_cpu or memory[k] < pod.required_memory or risk[k] > pod.required_risk:
+                    continue
+                if k < size:
+                    stack.append(2*k + 1)
+                    stack.append(2*k)
+                    continue
+                member = members[k - size]
+                node = member[2]
+                if node.cpu.level >= pod.required_cpu and node.memory.level >= pod.required_memory:
+                    if best is None or member[:2] < best[:2]:
+                        best = member
+                    break
+        return None if best is None else best[2]
+
+    def update(self, node):
+        """Free CPU and memory of the node changed."""
+        key, k = self.leaf[node.id]
+        _, _, cpu, memory, _ = self.groups[key]
+        cpu[k], memory[k] = node.cpu.level, node.memory.level
+        k //= 2
+        while k:
+            cpu[k] = max(cpu[2*k], cpu[2*k + 1])
+            memory[k] = max(memory[2*k], memory[2*k + 1])
+            k //= 2
+
+
+# Index of each node list, built at its first allocation
+_node_index = {}
+
+def node_index(nodes):
+    entry = _node_index.get(id(nodes))
+    if entry is None or entry[0] is not nodes:
+        entry = _node_index[id(nodes)] = (nodes, NodeIndex(nodes))
+    return entry[1]
+
+class WaitQueues:
+    """
+    Pods that could not be placed, waiting in FIFO queues per placement
+    class (node type, region). When resources are released on a node, the
+    waiting pods of its type and region, or of region 0, that fit in the
+    free resources of the node are woken up in arrival order; the others are
+    not disturbed. A woken pod which finds no node any more is queued again
+    at its place: the wake-up event carries its arrival number, given back
+    to wait().
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.queues = {}
+        self.counter = count()
+        self.waiting = 0
+
+    def __len__(self):
+        return self.waiting
+
+    def wait(self, pod, seq=None):
+        """
+        Event triggered, with the arrival number of the pod as value, when
+        resources the pod may use are released (seq: number of a woken pod).
+        """
+        event = self.env.event()
+        if seq is None:
+            seq = next(self.counter)
+        insort(self.queues.setdefault((pod.required_nodeType, pod.required_region), []), (seq, pod, event))
+        self.waiting += 1
+        return event
+
+    def release(self, node):
+        """Wake the waiting pods which fit in the free resources of the node."""
+        cpu, memory = node.cpu.level, node.memory.level
+        queues = [self.queues[key] for key in dict.fromkeys([(node.type, node.region), (node.type, 0)])
+                  if self.queues.get(key)]
+        if not queues:
+            return
+        # Both queues are sorted by arrival: merged lazily, without sorting them again
+        woken = set()
+        first = [None] * len(queues)
+        for (seq, pod, event), q, i in merge(*[zip(queue, repeat(q), count()) for q, queue in enumerate(queues)],
+                                             key=lambda item: item[0][0]):
+            if node.risk <= pod.required_risk and pod.required_cpu <= cpu and pod.required_memory <= memory:
+                cpu -= pod.required_cpu
+                memory -= pod.required_memory
+                woken.add(seq)
+                if first[q] is None:
+                    first[q] = i
+                event.succeed(seq)
+        # The woken pods removed in one pass over each queue, from its first woken pod
+        self.waiting -= len(woken)
+        for queue, i in zip(queues, first):
+            if i is not None:
+                queue[i:] = [entry for entry in queue[i:] if entry[0] not in woken]
+
+
+# Wait queues of each node list
+_wait_queues = {}
+
+def wait_queues(env, nodes):
+    entry = _wait_queues.get(id(nodes))
+    if entry is None or entry[0] is not nodes:
+        entry = _wait_queues[id(nodes)] = (nodes, WaitQueues(env))
+    return entry[1]
+
 # -----------------------------
 # Allocation Logic
 # -----------------------------
@@ -127,33 +333,19 @@ total_energy_cost = 0.0
 total_risk = 0.0
 
 
-def allocate_pod(env, pod, nodes, retry_interval=0.1, max_interval = 1):
+def allocate_pod(env, pod, nodes):
     global total_energy_cost, total_risk
     
     allocation = False
-    max_risk_cloud = max_risk(nodes)[0]
-    max_risk_edge =max_risk(nodes)[1]
-    max_price = max_eprice(nodes)
-    
-    if 'cloud' in pod.required_nodeType:       
-        nodes = sorted(nodes, key=lambda n: (theta_risk/2 * n.risk/(cloud_containers*max_risk_cloud)+ theta_price/3 * (n.eprice/(cloud_containers*max_price))+theta_price/3*(1-n.activation)*n.eprice/(Ncloud_int*max_price)))
-    elif 'edge' in pod.required_nodeType:
-        nodes = sorted(nodes, key=lambda n: (theta_risk/2 * n.risk/(edge_containers*max_risk_edge) + theta_price/3 * (n.eprice/(edge_containers*max_price))))
+    index = node_index(nodes)
+    waiting = wait_queues(env, nodes)
+    seq = None
 
     while allocation == False:
-        for node in nodes:
-            # 1) type match
-            if node.type != pod.required_nodeType:
-                continue
-            # 2) region constraint
-            if pod.required_region != 0 and node.region != pod.required_region:
-                continue
-            # 3) risk constraint
-            if node.risk > pod.required_risk:
-                continue
-            # 4) capacity check
-            if node.cpu.level < pod.required_cpu or node.memory.level < pod.required_memory:
-                continue
+        # Cheapest node of the type (1) and region (2) of the pod
+        # satisfying the risk (3) and capacity (4) constraints
+        node = index.first_fit(pod)
+        if node is not None:
             # 5) activation cost if first use
             if node.memory.level == node.total_memory and 'cloud' in node.type:
                 #norm_act = int(Pcloud)*(max_eprice(nodes)*node.power/1000)*0.5
@@ -161,10 +353,17 @@ def allocate_pod(env, pod, nodes, retry_interval=0.1, max_interval = 1):
 #               print('node_activated')
             else:
                 act_cost = 0
-            # reserve resources
-            yield node.cpu.get(pod.required_cpu)
-            yield node.memory.get(pod.required_memory)
-            print(f"Time {env.now:.2f}: Pod {pod.id} allocated to Node {node.id}")
+            # reserve resources (the levels change when the requests are made)
+            cpu_request = node.cpu.get(pod.required_cpu)
+            index.update(node)
+            yield cpu_request
+            memory_request = node.memory.get(pod.required_memory)
+            index.update(node)
+            yield memory_request
+            pod.start_time = env.now
+            if tracer.level <= INFO:
+                tracer.emit(INFO, 'allocation', env.now, pod.id, node.id,
+                            f"Time {env.now:.2f}: Pod {pod.id} allocated to Node {node.id}")
 #           print_to_file(output_file, (f"Time {env.now:.2f}: Pod {pod.id} allocated to Node {node.id} in region {node.region}"))
     
             # energy + risk metrics
@@ -189,22 +388,35 @@ def allocate_pod(env, pod, nodes, retry_interval=0.1, max_interval = 1):
 #           print(total_energy_cost)
             total_risk += rc#/2 
             # schedule release
-            env.process(release_pod(env, node, pod))
+            env.process(release_pod(env, node, pod, index, waiting))
             allocation = True
             return allocation
-        print(f"Time {env.now:.2f}: Pod {pod.id} could not be allocated. Retry in {retry_interval} hour")
-        yield env.timeout(retry_interval)
-        retry_interval = min(retry_interval * 2, max_interval)
+        if tracer.level <= DEBUG:
+            tracer.emit(DEBUG, 'blocked', env.now, pod.id, None,
+                        f"Time {env.now:.2f}: Pod {pod.id} could not be allocated. Waiting for resources")
+        # Woken up by release_pod when a node it may use has enough free resources,
+        # queued again at its place if it finds no node
+        seq = yield waiting.wait(pod, seq)
     return allocation
 
 
-def release_pod(env, node, pod):
+def release_pod(env, node, pod, index=None, waiting=None):
     yield env.timeout(pod.service_time)
-    yield node.cpu.put(pod.required_cpu)
-    yield node.memory.put(pod.required_memory)
+    cpu_release = node.cpu.put(pod.required_cpu)
+    if index is not None:
+        index.update(node)
+    yield cpu_release
+    memory_release = node.memory.put(pod.required_memory)
+    if index is not None:
+        index.update(node)
+    yield memory_release
+    if waiting is not None:
+        waiting.release(node)
 #    print_to_file(output_file, (f"Time {env.now:.2f}: Pod {pod.id} released from Node {node.id}"))
 
-    print(f"Time {env.now:.2f}: Pod {pod.id} released from Node {node.id}")
+    if tracer.level <= INFO:
+        tracer.emit(INFO, 'release', env.now, pod.id, node.id,
+                    f"Time {env.now:.2f}: Pod {pod.id} released from Node {node.id}")
 
 # -----------------------------
 # Processes
@@ -214,15 +426,90 @@ def arrival_and_allocate(env, nodes, pods):
         # wait until arrival
         yield env.timeout(pod.arr_time - env.now)
         
-        print(f"Time {env.now:.2f}: Pod {pod.id} arrived")
+        if tracer.level <= INFO:
+            tracer.emit(INFO, 'arrival', env.now, pod.id, None, f"Time {env.now:.2f}: Pod {pod.id} arrived")
 #        print_to_file(output_file, (f"Time {env.now:.2f}: Pod {pod.id} arrived"))
         # immediately try to allocate
         env.process(allocate_pod(env, pod, nodes))
 
+# -----------------------------
+# Replications
+# -----------------------------
+def replication(index, infra_xml, pods, seed=1, until=simulation_time):
+    """
+    Replication index of the simulation: the arrival time of each request
+    and the risk of each node are drawn again from the stream of (seed,
+    index), as in xml_generator; the requests arriving after the window
+    are dropped. Returns the totals and the waiting time statistics of the
+    served pods; the pods not allocated by the end are counted apart
+    (censored, with censored_wait the mean time they waited until the end,
+    a lower bound of their waits).
+    """
+    global total_energy_cost, total_risk
+    total_energy_cost = 0.0
+    total_risk = 0.0
+    _node_stats.clear()
+    _node_index.clear()
+    _wait_queues.clear()
+    np.random.seed(replication_seed(seed, index))
+    arrivals = poisson_arrivals_in_window(lambda_rate, simulation_time)
+
+    env = simpy.Environment()
+    nodes = parse_infrastructure_xml(infra_xml, env)
+    for node in nodes:
+        node.risk = round(extract_random_risk_sample(monte_carlo_risk_simulation(node.type, num_samples=10000, alpha=0.5, beta=0.5)), 4)
+    replica = []
+    for pod in pods:
+        if pod.request_id < len(arrivals):
+            pod = copy(pod)
+            pod.arr_time = arrivals[pod.request_id]
+            replica.append(pod)
+    replica.sort(key=lambda pod: pod.arr_time)
+
+    env.process(arrival_and_allocate(env, nodes, replica))
+    env.run(until=until)
+
+    waits = np.array([pod.start_time - pod.arr_time for pod in replica if pod.start_time is not None])
+    censored = np.array([env.now - pod.arr_time for pod in replica if pod.start_time is None])
+    return {
+        'energy_cost': total_energy_cost,
+        'risk': total_risk,
+        'objective': theta_price*total_energy_cost + theta_risk*total_risk,
+        'pods': len(replica),
+        'served': len(waits),
+        'mean_wait': float(waits.mean()) if len(waits) else 0.0,
+        'p95_wait': float(np.percentile(waits, 95)) if len(waits) else 0.0,
+        'max_wait': float(waits.max()) if len(waits) else 0.0,
+        'censored': len(censored),
+        'censored_wait': float(censored.mean()) if len(censored) else 0.0,
+    }
+
 # -----------------------------
 # Main Simulation
 # -----------------------------
-if __name__ == '__main__':
+if __name__ == '__main__' and replications > 0:
+    infra_xml = f'../data/input/Ncloud_{Ncloud}_Nedge_{Nedge}/Rollout_Ncloud_{Ncloud}_Nedge_{Nedge}_E{selected_regions}.xml'
+    appl_xml  = f'../data/input/Ncloud_{Ncloud}_Nedge_{Nedge}/Pcloud_{Pcloud}_Pedge_{Pedge}_E{selected_regions}.xml'
+    pods = parse_application_xml(appl_xml)
+
+    start = time()
+    runs = run_replications(partial(replication, infra_xml=infra_xml, pods=pods, seed=seed),
+                            replications, min_replications, precision,
+                            keys=['energy_cost', 'risk', 'mean_wait', 'censored'], confidence=confidence, processes=processes)
+    end = time()
+
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write('f_el f_risk lambda' + "\n")
+    for run in runs:
+        print_to_file(output_file, (f"{run['energy_cost']} {run['risk']} {lambda_rate}"))
+
+    print(f"{len(runs)} replications in {end - start:.2f}s (seed {seed}), means with {confidence:.0%} confidence intervals:")
+    for key, (mean, half_width, std) in summarize(runs, confidence).items():
+        print(f"{key:>13}: {mean:.4f} +/- {half_width:.4f} (std {std:.4f})")
+
+elif __name__ == '__main__':
+    configure(trace_level, trace_file, trace_echo, trace_sample)
     env = simpy.Environment()
 
     # If rollout is considered
@@ -236,10 +523,17 @@ if __name__ == '__main__':
 
     # start arrival/allocation process
     env.process(arrival_and_allocate(env, nodes, pods))
+    if monitor_interval:
+        monitor = UtilizationMonitor(env, nodes, monitor_interval, cloud=['cloud' in node.type for node in nodes],
+                                     backlog=lambda: len(wait_queues(env, nodes)), node_ids=[node.id for node in nodes],
+                                     until=simulation_time)
+        env.process(monitor.process())
 
     start = time()
     env.run(until=simulation_time)
     end = time()
+    if monitor_interval:
+        monitor.save(monitor_file)
 
     # write results
     results = [
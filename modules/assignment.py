@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Structured result of the container-node assignment ILP.
+
+The solution is kept as index arrays into the container and node lists
+used to build the model, so it can be applied to the infrastructure
+without parsing the names of the decision variables.
+"""
+import numpy as np
+
+
+class Assignment:
+    def __init__(self, containers, nodes, container_index, node_index, cpu, memory,
+                 status=None, objective=None, components=None):
+        self.containers = containers
+        self.nodes = nodes
+        self.container_index = np.asarray(container_index, dtype=np.intp)
+        self.node_index = np.asarray(node_index, dtype=np.intp)
+        self.cpu = np.asarray(cpu, dtype=float)
+        self.memory = np.asarray(memory, dtype=float)
+        self.status = status
+        self.objective = objective
+        self.components = components if components is not None else {}
+
+    @classmethod
+    def from_pairs(cls, feasibility, x, status=None, objective=None, components=None):
+        """
+        Build the assignment from the values x of the X variables, given in
+        the pair order of the FeasibilityIndex.
+        """
+        selected = np.flatnonzero(np.asarray(x[:feasibility.nPair]) > 0.5)
+        container_index = feasibility.pair_container[selected]
+        node_index = feasibility.pair_node[selected]
+        return cls(feasibility.containers, feasibility.nodes, container_index, node_index,
+                   feasibility.c['Ncore'][container_index], feasibility.c['mainMemory'][container_index],
+                   status, objective, components)
+
+    def __len__(self):
+        return len(self.container_index)
+
+    def node_ids(self):
+        """Ids of the nodes hosting the assigned containers."""
+        return np.array([self.nodes[j].id for j in self.node_index.tolist()], dtype=int)
+
+    def pairs(self):
+        """(container, node) objects of the assignment."""
+        return [(self.containers[i], self.nodes[j])
+                for i, j in zip(self.container_index.tolist(), self.node_index.tolist())]
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Per-region decomposition of the container-node assignment ILP.
+
+Containers with a region can only be placed on the nodes of that region,
+so the ILP splits into one independent block per region, coupled only by
+the containers of region 0 (any region). The region blocks are solved
+concurrently (threads waiting on one CBC process each), then the region-0
+containers are placed by a master problem on the residual capacities, the
+cloud nodes already used by the blocks counting as active. If the master
+problem is infeasible, the whole problem is solved at once.
+
+The electricity costs of every block and of the master problem are
+normalized as in the full model, so that the blocks weight f_el against
+f_risk as the full model does: without region-0 containers the merged
+assignment is optimal for the full model. The merged assignment is
+evaluated with the coefficients of the full model; since the region-0
+containers are placed after the region blocks, the result can otherwise be
+slightly worse than the optimum of the full model (compare=True reports
+the difference).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+import numpy as np
+from pulp import LpStatusOptimal, LpStatusInfeasible
+
+from feasibility import FeasibilityIndex
+from matrix_model import MatrixModel, evaluate_assignment, objective_normalizers
+
+
+def sub_index(feasibility, containers, n=None):
+    """FeasibilityIndex restricted to the containers with the given (sorted) indices."""
+    fi = feasibility
+    keep = np.isin(fi.pair_container, containers)
+    c = {key: values[containers] for key, values in fi.c.items()}
+    pair_container = np.searchsorted(containers, fi.pair_container[keep])
+    return FeasibilityIndex.from_pairs([fi.containers[i] for i in containers.tolist()], fi.nodes, c,
+                                       fi.n if n is None else n, pair_container, fi.pair_node[keep])
+
+
+class RegionDecomposition:
+    """Region-decomposed model, with the same solve() interface as MatrixModel."""
+
+    def __init__(self, appl, infra, cloud_containers, edge_containers, workers=None, compare=False):
+        self.appl = appl
+        self.compare = compare
+        self.infra = infra
+        self.cloud_containers = cloud_containers
+        self.edge_containers = edge_containers
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.feasibility = FeasibilityIndex(appl.containerList, infra.nodeList)
+        region = self.feasibility.c['region']
+        self.regions = sorted(set(region[region != 0].tolist()))
+        self.blocks = [np.flatnonzero(region == r) for r in self.regions]
+        self.shared = np.flatnonzero(region == 0)
+        # Normalization of the full model, shared by all the sub-models
+        self.normalizers = objective_normalizers(infra, self.feasibility.c, self.feasibility.n)
+
+    def solve_block(self, containers, theta_risk, theta_el, msg, options, warm_start, n=None):
+        """Solve the model of the given containers (on the node arrays n, default: current state)."""
+        model = MatrixModel(None, self.infra, self.cloud_containers, self.edge_containers,
+                            feasibility=sub_index(self.feasibility, containers, n), normalizers=self.normalizers)
+        return model.solve(theta_risk, theta_el, msg=msg, options=options, warm_start=warm_start)
+
+    def solve(self, theta_risk=0.5, theta_el=0.5, msg=False, options=None, warm_start=False, compare=None):
+        """
+        Solve the region blocks and the master problem and return the merged
+        MatrixSolution; with compare=True (default: the compare of the model)
+        the full model is solved too, see exact_objective and objective_loss.
+        """
+        if compare is None:
+            compare = self.compare
+        start = time()
+        n = self.feasibility.n
+        container_node = np.full(self.feasibility.nContainer, -1, dtype=np.intp)
+        status = LpStatusOptimal
+
+        # Region blocks, in parallel
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(self.blocks)))) as pool:
+            solutions = list(pool.map(lambda block: self.solve_block(block, theta_risk, theta_el, msg, options, warm_start),
+                                      self.blocks))
+        for block, solution in zip(self.blocks, solutions):
+            if solution.status != LpStatusOptimal:
+                status = LpStatusInfeasible
+            container_node[block[solution.assignment.container_index]] = solution.assignment.node_index
+
+        # Master problem: region-0 containers on the residual capacities
+        if len(self.shared) and status == LpStatusOptimal:
+            assigned = np.flatnonzero(container_node >= 0)
+            nodes = container_node[assigned]
+            residual = dict(n)
+            residual['Ncore'] = n['Ncore'] - np.bincount(nodes, weights=self.feasibility.c['Ncore'][assigned], minlength=len(n['Ncore']))
+            residual['mainMemory'] = n['mainMemory'] - np.bincount(nodes, weights=self.feasibility.c['mainMemory'][assigned], minlength=len(n['Ncore']))
+            residual['activation'] = n['activation'].copy()
+            residual['activation'][nodes] = 1
+            master = self.solve_block(self.shared, theta_risk, theta_el, msg, options, warm_start, residual)
+            if master.status == LpStatusOptimal:
+                container_node[self.shared[master.assignment.container_index]] = master.assignment.node_index
+            else:
+                # Blocks too tight for the shared containers: solve the full problem
+                full = MatrixModel(self.appl, self.infra, self.cloud_containers, self.edge_containers,
+                                   feasibility=self.feasibility).solve(theta_risk, theta_el, msg=msg, options=options,
+                                                                       warm_start=warm_start)
+                full.solutionTime = time() - start
+                return full
+
+        solution = evaluate_assignment(self.appl, self.infra, self.cloud_containers, self.edge_containers,
+                                       n, container_node, status, theta_risk, theta_el)
+        solution.solutionTime = time() - start
+        solution.exact_objective = None
+        solution.objective_loss = None
+        if compare:
+            exact = MatrixModel(self.appl, self.infra, self.cloud_containers, self.edge_containers,
+                                feasibility=self.feasibility).solve(theta_risk, theta_el, msg=msg, options=options)
+            solution.exact_objective = exact.objective
+            solution.objective_loss = solution.objective - exact.objective
+        return solution
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized prefiltering of the (container, node) pairs of the ILP.
+
+The compatibility rules are the ones of the original prefiltering step:
+    - the container node type matches the node type
+    - the node risk does not exceed the maximum risk allowed by the container
+    - the container region is 0 (any region) or equal to the node region
+    - edge nodes which are already activated cannot host new containers
+"""
+import numpy as np
+
+# Maximum number of mask entries evaluated at once (bounds the memory used
+# by the dense boolean block of each chunk of containers)
+CHUNK_ENTRIES = 2**24
+
+
+def container_arrays(containers):
+    """Return the attributes used by the prefiltering as NumPy arrays."""
+    return {
+        'is_cloud': np.array([c.nodeType == 'cloud-cpu' for c in containers], dtype=bool),
+        'nodeType': np.array([c.nodeType for c in containers], dtype=object),
+        'Ncore': np.array([c.Ncore for c in containers], dtype=float),
+        'mainMemory': np.array([c.mainMemory for c in containers], dtype=float),
+        'risk': np.array([c.risk for c in containers], dtype=float),
+        'region': np.array([c.region for c in containers], dtype=int),
+    }
+
+
+def node_arrays(nodes):
+    """Return the node attributes used by the ILP as NumPy arrays."""
+    return {
+        'is_cloud': np.array([n.type == 'cloud-cpu' for n in nodes], dtype=bool),
+        'type': np.array([n.type for n in nodes], dtype=object),
+        'Ncore': np.array([n.Ncore for n in nodes], dtype=float),
+        'mainMemory': np.array([n.mainMemory for n in nodes], dtype=float),
+        'risk': np.array([n.risk for n in nodes], dtype=float),
+        'region': np.array([n.region for n in nodes], dtype=int),
+        'power': np.array([n.power for n in nodes], dtype=float),
+        'eprice': np.array([n.eprice for n in nodes], dtype=float),
+        'activation': np.array([n.activation for n in nodes], dtype=float),
+    }
+
+
+def container_classes(containers):
+    """
+    Group interchangeable containers, i.e. containers with the same
+    (nodeType, Ncore, mainMemory, risk, region). Returns one array of
+    container indices per class, in order of first appearance.
+    """
+    classes = {}
+    for i, c in enumerate(containers):
+        classes.setdefault((c.nodeType, c.Ncore, c.mainMemory, c.risk, c.region), []).append(i)
+    return [np.array(members, dtype=np.intp) for members in classes.values()]
+
+
+class FeasibilityIndex:
+    """
+    Sparse container x node compatibility matrix.
+
+    Valid pairs are stored in COO form sorted by container (pair k couples
+    container pair_container[k] with node pair_node[k]); the pair index k
+    can be used directly as the column index of a decision variable.
+    Forward (container -> nodes) and reverse (node -> containers) indexes
+    are kept in CSR form.
+    """
+
+    def __init__(self, containers, nodes):
+        self._set_data(containers, nodes, container_arrays(containers), node_arrays(nodes))
+        self._build()
+
+    @classmethod
+    def from_arrays(cls, containers, nodes, c, n):
+        """Index prefiltered on the given attribute arrays (e.g. residual capacities and activation)."""
+        index = cls.__new__(cls)
+        index._set_data(containers, nodes, c, n)
+        index._build()
+        return index
+
+    @classmethod
+    def from_pairs(cls, containers, nodes, c, n, pair_container, pair_node):
+        """
+        Index of already prefiltered pairs, with the attribute arrays c and n
+        of the containers and nodes (pair_container must be sorted).
+        """
+        index = cls.__new__(cls)
+        index._set_data(containers, nodes, c, n)
+        index.pair_container = np.asarray(pair_container, dtype=np.intp)
+        index.pair_node = np.asarray(pair_node, dtype=np.intp)
+        index._build_indexes()
+        return index
+
+    def _set_data(self, containers, nodes, c, n):
+        self.containers = list(containers)
+        self.nodes = list(nodes)
+        self.c = c
+        self.n = n
+        self.nContainer = len(self.containers)
+        self.nNode = len(self.nodes)
+
+    def _build(self):
+        c, n = self.c, self.n
+        # Integer codes for the node types, so that types compare as numbers
+        types = {t: k for k, t in enumerate(sorted(set(c['nodeType']) | set(n['type'])))}
+        c_code = np.array([types[t] for t in c['nodeType']], dtype=int)
+        n_code = np.array([types[t] for t in n['type']], dtype=int)
+        # Nodes that may host new edge containers
+        n_open = n['activation'] == 0
+
+        rows, cols = [], []
+        chunk = max(1, CHUNK_ENTRIES // max(1, self.nNode))
+        for start in range(0, self.nContainer, chunk):
+            sl = slice(start, start + chunk)
+            mask = c_code[sl, None] == n_code[None, :]
+            mask &= n['risk'][None, :] <= c['risk'][sl, None]
+            mask &= (c['region'][sl, None] == 0) | (c['region'][sl, None] == n['region'][None, :])
+            mask &= n_open[None, :] | c['is_cloud'][sl, None]
+            r, k = np.nonzero(mask)
+            rows.append(r + start)
+            cols.append(k)
+        self.pair_container = np.concatenate(rows) if rows else np.zeros(0, dtype=np.intp)
+        self.pair_node = np.concatenate(cols) if cols else np.zeros(0, dtype=np.intp)
+        self._build_indexes()
+
+    def _build_indexes(self):
+        self.nPair = len(self.pair_container)
+
+        # Forward index (pairs are already sorted by container)
+        self.container_indptr = np.zeros(self.nContainer + 1, dtype=np.intp)
+        np.cumsum(np.bincount(self.pair_container, minlength=self.nContainer),
+                  out=self.container_indptr[1:])
+
+        # Reverse index: pair ids grouped by node
+        self.node_pairs = np.argsort(self.pair_node, kind='stable')
+        self.node_indptr = np.zeros(self.nNode + 1, dtype=np.intp)
+        np.cumsum(np.bincount(self.pair_node, minlength=self.nNode),
+                  out=self.node_indptr[1:])
+
+    def pairs_of_container(self, i):
+        """Pair ids of the container with index i."""
+        return np.arange(self.container_indptr[i], self.container_indptr[i + 1])
+
+    def pairs_of_node(self, j):
+        """Pair ids of the node with index j."""
+        return self.node_pairs[self.node_indptr[j]:self.node_indptr[j + 1]]
+
+    def nodes_for(self, i):
+        """Indices of the nodes that can host the container with index i."""
+        return self.pair_node[self.container_indptr[i]:self.container_indptr[i + 1]]
+
+    def containers_for(self, j):
+        """Indices of the containers that can be hosted by the node with index j."""
+        return self.pair_container[self.pairs_of_node(j)]
+
+    def mask(self):
+        """Dense boolean compatibility matrix (only meant for small cases)."""
+        mask = np.zeros((self.nContainer, self.nNode), dtype=bool)
+        mask[self.pair_container, self.pair_node] = True
+        return mask
+
+    def valid_pairs(self):
+        """Dictionary container -> list of valid nodes, as in the original prefiltering."""
+        return {container: [self.nodes[j] for j in self.nodes_for(i)]
+                for i, container in enumerate(self.containers)}
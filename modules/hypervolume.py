@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Exact hypervolume of 2-D fronts (both objectives minimized).
+
+The points are sorted once by the first objective; the non-dominated ones
+form a staircase with decreasing second objective, so the hypervolume with
+respect to the reference point and the exclusive contribution of every
+point (the hypervolume lost when removing it) follow from the neighbours
+of each step, less the part of the step covered by the points that it
+alone dominates, in O(n log n) for the whole front. Dominated, duplicated
+or outside of the reference box points contribute 0.
+"""
+import numpy as np
+
+
+def _as_points(points):
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+
+def reference_point(*fronts, margin=0.1):
+    """Worst value of each objective over the fronts, increased by margin (relative)."""
+    worst = np.max(np.vstack([_as_points(front) for front in fronts]), axis=0)
+    return worst + margin * np.abs(worst)
+
+
+def staircase(points, ref):
+    """Indices of the non-dominated points inside the reference box, by increasing first objective."""
+    points = _as_points(points)
+    ref = np.asarray(ref, dtype=float)
+    inside = np.flatnonzero(np.all(points < ref, axis=1))
+    order = inside[np.lexsort((points[inside, 1], points[inside, 0]))]
+    y = points[order, 1]
+    # Strictly below all the points with lower (or equal) first objective
+    best = np.minimum.accumulate(np.concatenate(([ref[1]], y)))[:-1]
+    return order[y < best]
+
+
+def front_hypervolume(points, ref):
+    """Hypervolume of the front and exclusive contribution of each point (array in the order of points)."""
+    points = _as_points(points)
+    ref = np.asarray(ref, dtype=float)
+    contributions = np.zeros(len(points))
+    steps = staircase(points, ref)
+    if len(steps) == 0:
+        return 0.0, contributions
+    x, y = points[steps, 0], points[steps, 1]
+    right = np.append(x[1:], ref[0])
+    above = np.insert(y[:-1], 0, ref[1])
+    hv = float(np.sum((right - x) * (ref[1] - y)))
+    contributions[steps] = (right - x) * (above - y)
+
+    # Removing a step uncovers the points dominated by it alone (duplicates
+    # included): their hypervolume in the box of the step is not lost
+    others = np.setdiff1d(np.flatnonzero(np.all(points < ref, axis=1)), steps)
+    if len(others):
+        first = np.searchsorted(-y, -points[others, 1], side='left')
+        last = np.searchsorted(x, points[others, 0], side='right')
+        sole = last - first == 1
+        others, owner = others[sole], first[sole]
+    if len(others):
+        order = np.lexsort((points[others, 1], points[others, 0], owner))
+        others, owner = others[order], owner[order]
+        # Staircase of each group: running minimum of the ranks of the second
+        # objective, shifted so that every group starts below the previous ones
+        ranks = np.unique(points[others, 1], return_inverse=True)[1].reshape(-1)
+        shifted = ranks - owner * (len(others) + 1)
+        best = np.minimum.accumulate(np.concatenate(([shifted[0] + 1], shifted)))[:-1]
+        keep = shifted < best
+        others, owner = others[keep], owner[keep]
+        gx, gy = points[others, 0], points[others, 1]
+        last_of_group = np.append(owner[1:] != owner[:-1], True)
+        gright = np.where(last_of_group, right[owner], np.append(gx[1:], 0.0))
+        covered = np.bincount(owner, weights=(gright - gx) * (above[owner] - gy), minlength=len(steps))
+        contributions[steps] -= covered
+    return hv, contributions
+
+
+def hypervolume(points, ref):
+    """Hypervolume of the front with respect to the reference point."""
+    return front_hypervolume(points, ref)[0]
+
+
+def box_volumes(points, ref):
+    """Hypervolume of each point alone."""
+    return np.prod(np.clip(np.asarray(ref, dtype=float) - _as_points(points), 0, None), axis=1)
+
+
+def delta_hypervolume(front, baseline, ref):
+    """Hypervolume of front minus that of baseline, and both hypervolumes."""
+    hv_front, hv_baseline = hypervolume(front, ref), hypervolume(baseline, ref)
+    return hv_front - hv_baseline, hv_front, hv_baseline
@@ -0,0 +1,761 @@
+# -*- coding: utf-8 -*-
+"""
+Matrix form of the container-node assignment ILP.
+
+The unicity, CPU, memory and NodeUsage constraints and the normalized
+risk/electricity cost terms of ilp_solver.main are generated directly as
+sparse coefficient arrays (COO format) and written to an MPS file which is
+handed to CBC, without materialising any PuLP variable or expression. Other
+backends (see solver_backend.py) read the MPS file through PuLP.
+
+Columns 0..nPair-1 are the X variables of the valid (container, node) pairs
+(in the order of the FeasibilityIndex), the following columns are the Y
+variables of the cloud nodes which can host at least one container (Y is 0
+for the other cloud nodes, so they are left out of the model).
+
+With aggregate=True, interchangeable containers (same nodeType, Ncore,
+mainMemory, risk and region) are grouped into classes and the X columns are
+integer counts of containers of a class placed on a node; the solution is
+then disaggregated to single containers. The optimal objective is the same
+as the one of the binary model.
+
+A node_multiplicity vector turns the node columns into classes of identical
+nodes (see node_classes.py): the node capacities are the totals of the class
+and Y counts the active nodes of the class.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from time import time
+
+import numpy as np
+from pulp import PULP_CBC_CMD, LpProblem, LpStatusOptimal, LpStatusInfeasible, LpStatusUnbounded, LpStatusNotSolved, LpStatusUndefined
+
+from feasibility import FeasibilityIndex, container_arrays, container_classes, node_arrays
+from assignment import Assignment
+from solver_backend import SolverOptions, resolve_backend, pulp_solver, cbc_arguments, cbc_log_stats
+from warm_start import greedy_start
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# CBC status strings (first word of the solution file), as read by PuLP
+CBC_STATUS = {
+    'Optimal': LpStatusOptimal,
+    'Infeasible': LpStatusInfeasible,
+    'Integer': LpStatusInfeasible,
+    'Unbounded': LpStatusUnbounded,
+    'Stopped': LpStatusNotSolved,
+}
+
+# Names of the normalized cost components
+COMPONENTS = ('f_risk_cloud', 'f_risk_edge', 'f_el_cloud', 'f_el_edge', 'f_el_act')
+
+
+class SolutionVariable:
+    """Name/value pair exposing the same attributes as a solved LpVariable."""
+
+    def __init__(self, name, value):
+        self.name = name
+        self.varValue = value
+
+
+class MatrixModel:
+    """
+    Sparse coefficient representation of the ILP of ilp_solver.main.
+
+    cloud_containers and edge_containers are the numbers of containers used
+    in the normalization of the risk cost function (as in ilp_solver.main,
+    they are taken from the parameter file and not from the application).
+    The electricity cost functions are normalized over the containers and
+    nodes of the model, unless the normalizers of a larger model are given
+    (see objective_normalizers), e.g. for the sub-models of a decomposition.
+    """
+
+    def __init__(self, appl, infra, cloud_containers, edge_containers, feasibility=None, aggregate=False,
+                 node_multiplicity=None, normalizers=None):
+        self.appl = appl
+        self.normalizers = normalizers
+        self.infra = infra
+        self.cloud_containers = cloud_containers
+        self.edge_containers = edge_containers
+        # Containers of each class (None for the binary model)
+        self.members = None
+        if feasibility is None:
+            containers = appl.containerList
+            if aggregate:
+                self.members = container_classes(containers)
+                containers = [containers[members[0]] for members in self.members]
+            feasibility = FeasibilityIndex(containers, infra.nodeList)
+        self.feasibility = feasibility
+        if self.members is None:
+            self.multiplicity = np.ones(feasibility.nContainer)
+        else:
+            self.multiplicity = np.array([len(members) for members in self.members], dtype=float)
+        self.node_multiplicity = node_multiplicity
+        self.build()
+
+    # ------------------------------------------------------------------
+    # Model generation
+    # ------------------------------------------------------------------
+    def build(self):
+        fi = self.feasibility
+        c, n = fi.c, fi.n
+        pc, pn = fi.pair_container, fi.pair_node
+        nPair = fi.nPair
+
+        # Y variables of the cloud nodes hosting at least one pair
+        n_pairs = np.diff(fi.node_indptr)
+        used = np.flatnonzero(n_pairs > 0)
+        self.cloud_nodes = used[n['is_cloud'][used]]
+        self.y_column = np.full(fi.nNode, -1, dtype=np.intp)
+        self.y_column[self.cloud_nodes] = nPair + np.arange(len(self.cloud_nodes))
+        self.nCol = nPair + len(self.cloud_nodes)
+
+        rows, cols, vals = [], [], []
+        sense, rhs, names = [], [], []
+
+        def add_rows(row_names, row_sense, row_rhs):
+            first = len(names)
+            names.extend(row_names)
+            sense.extend([row_sense] * len(row_names))
+            rhs.extend(row_rhs)
+            return first
+
+        # Unicity: every container is assigned to exactly one node
+        # (aggregated model: all the containers of a class are assigned)
+        first = add_rows([f"unicity_{cont.id}" for cont in fi.containers], 'E', self.multiplicity)
+        rows.append(first + pc)
+        cols.append(np.arange(nPair))
+        vals.append(np.ones(nPair))
+
+        # CPU and memory capacity of the nodes hosting at least one pair
+        row_of_node = np.full(fi.nNode, -1, dtype=np.intp)
+        row_of_node[used] = np.arange(len(used))
+        first = add_rows([f"CPU_{fi.nodes[j].id}" for j in used], 'L', n['Ncore'][used])
+        self.cpu_rows = first + row_of_node
+        rows.append(first + row_of_node[pn])
+        cols.append(np.arange(nPair))
+        vals.append(c['Ncore'][pc])
+        first = add_rows([f"memory_{fi.nodes[j].id}" for j in used], 'L', n['mainMemory'][used])
+        self.memory_rows = first + row_of_node
+        rows.append(first + row_of_node[pn])
+        cols.append(np.arange(nPair))
+        vals.append(c['mainMemory'][pc])
+        self.cpu_rows[row_of_node < 0] = -1
+        self.memory_rows[row_of_node < 0] = -1
+
+        # Upper bounds of the columns: class size, limited by the node capacity
+        nm = self.node_multiplicity if self.node_multiplicity is not None else np.ones(fi.nNode)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fit = nm[pn] * np.minimum(np.floor(n['Ncore'][pn] / nm[pn] / c['Ncore'][pc]),
+                                      np.floor(n['mainMemory'][pn] / nm[pn] / c['mainMemory'][pc]))
+        self.upper = np.ones(self.nCol)
+        self.upper[:nPair] = np.minimum(self.multiplicity[pc], np.nan_to_num(fit, nan=np.inf, posinf=np.inf))
+        self.upper[nPair:] = nm[self.cloud_nodes]
+        max_count = np.bincount(pn, weights=self.multiplicity[pc], minlength=fi.nNode)
+
+        # NodeUsage: Y_n = 1 iff at least one container is assigned to the cloud node n
+        cloud = self.cloud_nodes
+        row_of_cloud = np.full(fi.nNode, -1, dtype=np.intp)
+        row_of_cloud[cloud] = np.arange(len(cloud))
+        on_cloud = np.flatnonzero(n['is_cloud'][pn])
+        for label, row_sense in (('NodeUsage', 'L'), ('NodeUsage2', 'G')):
+            first = add_rows([f"{label}_{fi.nodes[j].id}" for j in cloud], row_sense, [0.0] * len(cloud))
+            rows.append(first + row_of_cloud[pn[on_cloud]])
+            cols.append(on_cloud)
+            rows.append(first + np.arange(len(cloud)))
+            cols.append(self.y_column[cloud])
+            if label == 'NodeUsage' and self.node_multiplicity is not None:
+                # Node classes: the cores used cannot exceed the cores of the active nodes
+                vals.append(c['Ncore'][pc[on_cloud]])
+                vals.append(-n['Ncore'][cloud] / nm[cloud])
+            else:
+                vals.append(np.ones(len(on_cloud)))
+                vals.append(-max_count[cloud] if label == 'NodeUsage' else -np.ones(len(cloud)))
+
+        self.A_row = np.concatenate(rows).astype(np.intp)
+        self.A_col = np.concatenate(cols).astype(np.intp)
+        self.A_val = np.concatenate(vals).astype(float)
+        self.row_sense = np.array(sense)
+        self.rhs = np.array(rhs, dtype=float)
+        self.row_names = names
+
+        self.build_objective()
+
+    def build_objective(self):
+        """Normalized cost components as coefficient vectors over the columns."""
+        fi = self.feasibility
+        nm = self.node_multiplicity if self.node_multiplicity is not None else np.ones(fi.nNode)
+        if self.normalizers is None:
+            self.normalizers = objective_normalizers(self.infra, fi.c, fi.n, self.multiplicity, nm)
+        self.components = cost_components(self.infra, fi.c, fi.n, fi.pair_container, fi.pair_node, self.cloud_nodes,
+                                          self.normalizers, self.cloud_containers, self.edge_containers, nm)
+
+    def objective(self, theta_risk=0.5, theta_el=0.5):
+        """Coefficient vector of theta_risk * f_risk + theta_el * f_el."""
+        return weighted_objective(self.components, theta_risk, theta_el)
+
+    # ------------------------------------------------------------------
+    # Names
+    # ------------------------------------------------------------------
+    def column_names(self):
+        """PuLP-like names of the decision variables (X_<container>_<node>, Y_<node>)."""
+        fi = self.feasibility
+        names = [f"X_{fi.containers[i].id}_{fi.nodes[j].id}"
+                 for i, j in zip(fi.pair_container.tolist(), fi.pair_node.tolist())]
+        names.extend(f"Y_{fi.nodes[j].id}" for j in self.cloud_nodes.tolist())
+        return names
+
+    # ------------------------------------------------------------------
+    # MPS output
+    # ------------------------------------------------------------------
+    def write_mps(self, filename, theta_risk=0.5, theta_el=0.5):
+        """
+        Write the model to a (fixed column name) MPS file. Columns are named
+        C<index> and rows R<index>, all variables are integer (binary when
+        their upper bound is 1).
+        """
+        obj = self.objective(theta_risk, theta_el)
+        obj_col = np.flatnonzero(obj)
+        # Entries of the COLUMNS section, the objective row is encoded as -1
+        col = np.concatenate([obj_col, self.A_col])
+        row = np.concatenate([np.full(len(obj_col), -1, dtype=np.intp), self.A_row])
+        val = np.concatenate([obj[obj_col], self.A_val])
+        order = np.lexsort((row, col))
+
+        with open(filename, 'w') as f:
+            f.write("NAME          Container_Node_Assignment\nROWS\n N  OBJ\n")
+            f.writelines(f" {s}  R{r:07d}\n" for r, s in enumerate(self.row_sense.tolist()))
+            f.write("COLUMNS\n    MARKER                 'MARKER'                 'INTORG'\n")
+            f.writelines(f"    C{k:07d}  {'OBJ' if r < 0 else f'R{r:07d}'}  {v:.15g}\n"
+                         for k, r, v in zip(col[order].tolist(), row[order].tolist(), val[order].tolist()))
+            # Columns without any coefficient still have to be declared
+            empty = np.setdiff1d(np.arange(self.nCol), col)
+            f.writelines(f"    C{k:07d}  OBJ  0\n" for k in empty.tolist())
+            f.write("    MARKER                 'MARKER'                 'INTEND'\nRHS\n")
+            f.writelines(f"    RHS  R{r:07d}  {v:.15g}\n" for r, v in enumerate(self.rhs.tolist()) if v != 0)
+            f.write("BOUNDS\n")
+            f.writelines(f" BV BND  C{k:07d}\n" if ub == 1 else f" UP BND  C{k:07d}  {ub:.15g}\n"
+                         for k, ub in enumerate(self.upper.tolist()))
+            f.write("ENDATA\n")
+
+    # ------------------------------------------------------------------
+    # Warm start
+    # ------------------------------------------------------------------
+    def start_values(self, counts):
+        """Column values of a start solution given as the number of containers placed on each pair."""
+        fi = self.feasibility
+        x = np.zeros(self.nCol)
+        x[:fi.nPair] = counts
+        on_node = np.bincount(fi.pair_node, weights=counts, minlength=fi.nNode)
+        x[fi.nPair:] = np.minimum(on_node[self.cloud_nodes], self.upper[fi.nPair:])
+        return x
+
+    def write_mipstart(self, filename, x):
+        """Write the column values x as a CBC solution file, to be read with -mips."""
+        with open(filename, 'w') as f:
+            f.write("Stopped on iterations - objective value 0\n")
+            f.writelines(f"{k:7d} C{k:07d} {v:.15g} 0\n" for k, v in enumerate(x.tolist()))
+
+    # ------------------------------------------------------------------
+    # Solve
+    # ------------------------------------------------------------------
+    def solve(self, theta_risk=0.5, theta_el=0.5, msg=False, keep_files=False, options=None, warm_start=False):
+        """
+        Solve the model and return a MatrixSolution. options is a
+        SolverOptions (default: CBC binary bundled with PuLP, with the given
+        msg). With warm_start=True the greedy assignment of warm_start.py is
+        passed to the solver as MIP start.
+        """
+        if options is None:
+            options = SolverOptions(msg=msg)
+        tmp_dir = tempfile.mkdtemp(prefix='matrix_model_')
+        mps_file = os.path.join(tmp_dir, 'model.mps')
+        sol_file = os.path.join(tmp_dir, 'model.sol')
+        start_file = os.path.join(tmp_dir, 'start.sol')
+        start = time()
+        x_start = None
+        if warm_start:
+            counts, complete = greedy_start(self.feasibility, self.cloud_containers, self.edge_containers,
+                                            theta_risk, theta_el, self.multiplicity)
+            x_start = self.start_values(counts)
+        start_time = time() - start
+        self.write_mps(mps_file, theta_risk, theta_el)
+        stats = {'first_incumbent_time': None, 'gap': None}
+        if resolve_backend(options.backend) == 'cbc':
+            cmd = [PULP_CBC_CMD().path, mps_file] + cbc_arguments(options)
+            if x_start is not None:
+                self.write_mipstart(start_file, x_start)
+                cmd += ['-mips', start_file]
+            cmd += ['-solve', '-solution', sol_file]
+            solver_start = time() - start
+            log = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            if options.msg:
+                print(log)
+            stats = cbc_log_stats(log)
+            status, x = read_cbc_solution(sol_file, self.nCol)
+        else:
+            variables, problem = LpProblem.fromMPS(mps_file)
+            if x_start is not None:
+                for k, value in enumerate(x_start.tolist()):
+                    variables[f"C{k:07d}"].setInitialValue(value)
+            solver_start = time() - start
+            status = problem.solve(pulp_solver(options, warm_start=x_start is not None))
+            x = np.array([variables[f"C{k:07d}"].varValue or 0 for k in range(self.nCol)])
+        solution_time = time() - start
+        if not keep_files:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        solution = MatrixSolution(self, status, x, solution_time, theta_risk, theta_el)
+        if stats['first_incumbent_time'] is not None:
+            # Measured from the beginning of the solve (greedy and model output included)
+            solution.first_incumbent_time = solver_start + stats['first_incumbent_time']
+        solution.gap = stats['gap']
+        if x_start is not None:
+            solution.start_objective = float(self.objective(theta_risk, theta_el) @ x_start)
+            solution.start_complete = complete
+            solution.start_time = start_time
+        return solution
+
+    def assignment(self, x, status=None, objective=None, components=None):
+        """Assignment of the single containers for the column values x."""
+        fi = self.feasibility
+        if self.members is None:
+            return Assignment.from_pairs(fi, x, status, objective, components)
+        # Disaggregation: the containers of a class are taken in order by the nodes of the class
+        counts = np.rint(x[:fi.nPair]).astype(np.intp)
+        selected = np.flatnonzero(counts > 0)
+        klass = np.repeat(fi.pair_container[selected], counts[selected])
+        node_index = np.repeat(fi.pair_node[selected], counts[selected])
+        rank = np.arange(len(klass)) - np.searchsorted(klass, klass, side='left')
+        valid = rank < self.multiplicity[klass]
+        offset = np.concatenate([[0], np.cumsum(self.multiplicity[:-1])]).astype(np.intp)
+        flat = np.concatenate(self.members) if self.members else np.zeros(0, dtype=np.intp)
+        klass, node_index = klass[valid], node_index[valid]
+        container_index = flat[offset[klass] + rank[valid]]
+        return Assignment(self.appl.containerList, fi.nodes, container_index, node_index,
+                          fi.c['Ncore'][klass], fi.c['mainMemory'][klass], status, objective, components)
+
+
+def cost_components(infra, c, n, pc, pn, cloud_nodes, normalizers, cloud_containers, edge_containers,
+                    node_multiplicity=None):
+    """
+    Normalized cost components over the X columns of the pairs (pc, pn)
+    followed by the Y columns of cloud_nodes, with the normalizers of
+    objective_normalizers.
+    """
+    nPair = len(pc)
+    edge_pair = ~n['is_cloud'][pn]
+    cloud_pair = n['is_cloud'][pn]
+
+    max_risk_cloud, max_risk_edge = infra.max_risk()
+    nm = node_multiplicity if node_multiplicity is not None else np.ones(len(n['power']))
+    max_el_cloud, max_el_edge, max_el_act = normalizers
+
+    comps = {name: np.zeros(nPair + len(cloud_nodes)) for name in COMPONENTS}
+    if edge_containers > 0 and max_risk_edge > 0:
+        comps['f_risk_edge'][:nPair] = np.where(edge_pair, n['risk'][pn], 0) / (edge_containers*max_risk_edge)
+    if cloud_containers > 0 and max_risk_cloud > 0:
+        comps['f_risk_cloud'][:nPair] = np.where(cloud_pair, n['risk'][pn], 0) / (cloud_containers*max_risk_cloud)
+
+    el_power = n['power'][pn]/1000 * n['eprice'][pn] * c['Ncore'][pc]
+    if max_el_edge > 0:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            comps['f_el_edge'][:nPair] = np.where(edge_pair, el_power / (n['Ncore'][pn] / nm[pn]), 0) / max_el_edge
+    # Cloud nodes cores varies during the loop, keep them fixed to 128
+    if max_el_cloud > 0:
+        comps['f_el_cloud'][:nPair] = np.where(cloud_pair, 0.5*el_power/128, 0) / max_el_cloud
+    # Small positive coefficient kept for already activated nodes, as in ilp_solver.main
+    if max_el_act > 0:
+        comps['f_el_act'][nPair:] = (1-n['activation'][cloud_nodes]+1e-10) * n['power'][cloud_nodes]/1000 * n['eprice'][cloud_nodes]*0.5 / max_el_act
+    return comps
+
+
+def weighted_objective(comps, theta_risk=0.5, theta_el=0.5):
+    """Coefficient vector of theta_risk * f_risk + theta_el * f_el for the cost components."""
+    f_risk = (comps['f_risk_cloud'] + comps['f_risk_edge'])/2
+    f_el = (comps['f_el_cloud'] + comps['f_el_edge'] + comps['f_el_act'])/3
+    return theta_risk * f_risk + theta_el * f_el
+
+
+def objective_normalizers(infra, c, n, multiplicity=None, node_multiplicity=None):
+    """
+    Maxima of the cloud, edge and activation electricity costs of the
+    containers and nodes with the attribute arrays c and n (and counts).
+    """
+    max_eprice = infra.max_eprice()
+    P_cloud, P_edge = infra.power_consumption()
+    mult = multiplicity if multiplicity is not None else np.ones(len(c['Ncore']))
+    nm = node_multiplicity if node_multiplicity is not None else np.ones(len(n['power']))
+    max_el_cloud = np.sum(mult[c['is_cloud']] * P_cloud/1000 * max_eprice*0.5*c['Ncore'][c['is_cloud']]/128)
+    max_el_edge = np.sum(mult[~c['is_cloud']]) * P_edge/1000 * max_eprice
+    max_el_act = np.sum(nm[n['is_cloud']] * n['power'][n['is_cloud']]/1000 * max_eprice*0.5)
+    return max_el_cloud, max_el_edge, max_el_act
+
+
+def evaluate_assignment(appl, infra, cloud_containers, edge_containers, n, container_node, status,
+                        theta_risk=0.5, theta_el=0.5):
+    """
+    MatrixSolution of a given assignment (node index of every container of
+    appl, -1 if not assigned), with the exact coefficients of the nodes
+    described by the arrays n.
+    """
+    assigned = np.flatnonzero(container_node >= 0)
+    feasibility = FeasibilityIndex.from_pairs(appl.containerList, infra.nodeList, container_arrays(appl.containerList),
+                                              n, assigned, container_node[assigned])
+    model = MatrixModel(appl, infra, cloud_containers, edge_containers, feasibility=feasibility)
+    return MatrixSolution(model, status, np.ones(model.nCol), 0, theta_risk, theta_el)
+
+
+def read_cbc_solution(filename, n_col):
+    """Read status and column values from a CBC solution file of a C<index>/R<index> MPS model."""
+    x = np.zeros(n_col)
+    with open(filename) as f:
+        status_strs = f.readline().split()
+        for line in f:
+            fields = line.split()
+            # In case the solution is infeasible
+            if fields and fields[0] == '**':
+                fields = fields[1:]
+            if len(fields) < 3 or not fields[1].startswith('C'):
+                continue
+            x[int(fields[1][1:])] = float(fields[2])
+    status = CBC_STATUS.get(status_strs[0], LpStatusUndefined) if status_strs else LpStatusUndefined
+    # Stopped on time/iterations with an integer solution
+    if status == LpStatusNotSolved and len(status_strs) >= 5 and status_strs[4] == 'objective':
+        status = LpStatusOptimal
+    return status, x
+
+
+class MatrixSolution:
+    """
+    Result of MatrixModel.solve. It offers the attributes of a solved
+    LpProblem used by the queue simulator (status, solutionTime, variables())
+    and the structured Assignment of the containers.
+    """
+
+    def __init__(self, model, status, x, solution_time, theta_risk, theta_el):
+        self.model = model
+        self.status = status
+        self.x = x
+        self.solutionTime = solution_time
+        self.components = {name: float(vec @ x) for name, vec in model.components.items()}
+        self.f_risk = (self.components['f_risk_cloud'] + self.components['f_risk_edge'])/2
+        self.f_el = (self.components['f_el_cloud'] + self.components['f_el_edge'] + self.components['f_el_act'])/3
+        self.objective = theta_risk * self.f_risk + theta_el * self.f_el
+        self.assignment = model.assignment(x, status, self.objective, self.components)
+        # Solver statistics, when available (see solver_backend.cbc_log_stats)
+        self.first_incumbent_time = None
+        self.gap = None
+        # Greedy MIP start (warm_start=True)
+        self.start_objective = None
+        self.start_complete = None
+        self.start_time = None
+
+    def variables(self):
+        """Decision variables (X and Y) with their values."""
+        if self.model.members is None:
+            names = self.model.column_names()
+            return [SolutionVariable(name, value) for name, value in zip(names, np.round(self.x).tolist())]
+        # Aggregated model: X variables of the disaggregated assignment
+        variables = [SolutionVariable(f"X_{container.id}_{node.id}", 1.0) for container, node in self.assignment.pairs()]
+        nodes = self.model.feasibility.nodes
+        y = np.round(self.x[self.model.feasibility.nPair:]).tolist()
+        variables.extend(SolutionVariable(f"Y_{nodes[j].id}", value) for j, value in zip(self.model.cloud_nodes.tolist(), y))
+        return variables
+
+
+def container_key(container):
+    """Identity of a container across the batches (the ids of different application files may repeat)."""
+    return (container.id, container.request_id, container.nodeType, container.Ncore, container.mainMemory,
+            container.risk, container.region)
+
+
+class IncrementalModel:
+    """
+    Matrix model kept alive across the cycles of the queue simulator, as an
+    in-process HiGHS model (highspy) updated in place.
+
+    The CPU and memory rows of the nodes, the NodeUsage rows and the Y
+    columns of the cloud nodes are created once. The X columns and the
+    unicity row of a container are added when it enters the batch and
+    deleted when it leaves it (served or trimmed); the containers which
+    stay in the batch keep their columns. Before each solve, only the nodes
+    modified in the Infrastructure (see Infrastructure.modified_nodes) are
+    re-read, then the residual capacities (row bounds), the columns that no
+    longer fit or sit on an activated edge node (upper bound 0) and the
+    costs (activation, normalization over the batch) are changed in the
+    live model, and HiGHS re-optimizes it: nothing is rebuilt, written to a
+    file or parsed again. The model and its objective are the ones of
+    MatrixModel on the same batch and node state. The backend of the
+    SolverOptions is ignored, the model is always solved by HiGHS.
+    """
+
+    def __init__(self, infra, cloud_containers, edge_containers):
+        if highspy is None:
+            raise ImportError("The incremental model needs highspy (pip install highspy)")
+        self.infra = infra
+        self.cloud_containers = cloud_containers
+        self.edge_containers = edge_containers
+        self.nodes = infra.nodeList
+        self.n = node_arrays(self.nodes)
+        self.node_index = {node.id: j for j, node in enumerate(self.nodes)}
+        infra.modified_nodes.clear()
+
+        # Nodes grouped by (type, region), sorted by risk; region 0 holds all nodes of a type
+        self.groups = {}
+        for node_type in set(self.n['type']):
+            of_type = np.flatnonzero(self.n['type'] == node_type)
+            keys = [(node_type, 0)] + [(node_type, r) for r in set(self.n['region'][of_type].tolist())]
+            for key in keys:
+                members = of_type if key[1] == 0 else of_type[self.n['region'][of_type] == key[1]]
+                members = members[np.argsort(self.n['risk'][members], kind='stable')]
+                self.groups[key] = (members, self.n['risk'][members])
+        self.columns = {}
+
+        # Rows: CPU and memory of every node, NodeUsage and NodeUsage2 of every cloud
+        # node, then the unicity rows of the containers of the batch
+        n_node = len(self.nodes)
+        self.cloud_nodes = np.flatnonzero(self.n['is_cloud'])
+        n_cloud = len(self.cloud_nodes)
+        self.y_column = np.full(n_node, -1, dtype=np.intp)
+        self.y_column[self.cloud_nodes] = np.arange(n_cloud)
+        self.usage_row = 2*n_node + np.arange(n_cloud)
+        self.usage2_row = self.usage_row + n_cloud
+        self.first_unicity_row = 2*n_node + 2*n_cloud
+        inf = highspy.kHighsInf
+        no_entries = (np.zeros(0, dtype=np.int32), np.zeros(0))
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        self.highs.addRows(2*n_node, np.full(2*n_node, -inf), np.concatenate([self.n['Ncore'], self.n['mainMemory']]),
+                           0, np.zeros(2*n_node, dtype=np.int32), *no_entries)
+        self.highs.addRows(n_cloud, np.full(n_cloud, -inf), np.zeros(n_cloud), 0, np.zeros(n_cloud, dtype=np.int32), *no_entries)
+        self.highs.addRows(n_cloud, np.zeros(n_cloud), np.full(n_cloud, inf), 0, np.zeros(n_cloud, dtype=np.int32), *no_entries)
+        # Y columns (first columns of the model): -1 in NodeUsage2, -(number of X columns of the node) in NodeUsage
+        self.add_columns(n_cloud, self.usage2_row, -np.ones(n_cloud), np.arange(n_cloud))
+        self.usage_count = np.zeros(n_cloud)
+
+        # X columns (after the Y columns): slot of the container, node, container requirements
+        self.slots = {}
+        self.next_slot = 0
+        self.col_slot = np.zeros(0, dtype=np.intp)
+        self.col_node = np.zeros(0, dtype=np.intp)
+        self.col_cpu = np.zeros(0)
+        self.col_memory = np.zeros(0)
+        self.row_slot = np.zeros(0, dtype=np.intp)
+        self.containers = []
+        self.model = None
+
+    def add_columns(self, count, entry_row, entry_value, entry_col):
+        """Add count binary columns with the given (row, value, column) entries."""
+        order = np.argsort(entry_col, kind='stable')
+        starts = np.zeros(count, dtype=np.int32)
+        starts[1:] = np.cumsum(np.bincount(entry_col, minlength=count))[:-1]
+        first = self.highs.getNumCol()
+        self.highs.addCols(count, np.zeros(count), np.zeros(count), np.ones(count), len(order), starts,
+                           np.asarray(entry_row, dtype=np.int32)[order], np.asarray(entry_value, dtype=float)[order])
+        self.highs.changeColsIntegrality(count, np.arange(first, first + count, dtype=np.int32),
+                                         np.full(count, highspy.HighsVarType.kInteger))
+
+    def update_nodes(self):
+        """Re-read residual capacities and activation of the modified nodes."""
+        n = self.n
+        for node_id in self.infra.modified_nodes:
+            j = self.node_index[node_id]
+            node = self.nodes[j]
+            n['Ncore'][j] = node.Ncore
+            n['mainMemory'][j] = node.mainMemory
+            n['activation'][j] = node.activation
+        self.infra.modified_nodes.clear()
+
+    def candidate_nodes(self, container):
+        """Indices of the nodes of the right type, region and risk for the container."""
+        key = (container.nodeType, container.region, container.risk)
+        nodes = self.columns.get(key)
+        if nodes is None:
+            members, risk = self.groups.get((container.nodeType, container.region), (np.zeros(0, dtype=np.intp), np.zeros(0)))
+            nodes = np.sort(members[:np.searchsorted(risk, container.risk, side='right')])
+            self.columns[key] = nodes
+        return nodes
+
+    def set_containers(self, containers):
+        """Set the containers of the current batch: delete the columns of the containers gone, add the new ones."""
+        self.containers = list(containers)
+        keys = [container_key(container) for container in self.containers]
+        batch = set(keys)
+        gone = [key for key in self.slots if key not in batch]
+        if gone:
+            gone_slots = [self.slots.pop(key) for key in gone]
+            n_cloud = len(self.cloud_nodes)
+            drop = np.isin(self.col_slot, gone_slots)
+            self.highs.deleteCols(int(drop.sum()), (n_cloud + np.flatnonzero(drop)).astype(np.int32))
+            self.col_slot, self.col_node = self.col_slot[~drop], self.col_node[~drop]
+            self.col_cpu, self.col_memory = self.col_cpu[~drop], self.col_memory[~drop]
+            drop = np.isin(self.row_slot, gone_slots)
+            self.highs.deleteRows(int(drop.sum()), (self.first_unicity_row + np.flatnonzero(drop)).astype(np.int32))
+            self.row_slot = self.row_slot[~drop]
+        new = []
+        for key, container in zip(keys, self.containers):
+            if key not in self.slots:
+                self.slots[key] = self.next_slot
+                self.next_slot += 1
+                new.append(container)
+        if new:
+            self.add_containers(new)
+        # Coefficient of Y in NodeUsage: number of X columns of the node
+        count = np.bincount(self.col_node, minlength=len(self.nodes))[self.cloud_nodes].astype(float)
+        for k in np.flatnonzero(count != self.usage_count).tolist():
+            self.highs.changeCoeff(int(self.usage_row[k]), k, -count[k])
+        self.usage_count = count
+
+    def add_containers(self, containers):
+        """Add the unicity rows and the X columns of new containers (their slots already set)."""
+        n = self.n
+        first_row = self.highs.getNumRow()
+        count = len(containers)
+        self.highs.addRows(count, np.ones(count), np.ones(count), 0, np.zeros(count, dtype=np.int32),
+                           np.zeros(0, dtype=np.int32), np.zeros(0))
+        slots = np.array([self.slots[container_key(container)] for container in containers], dtype=np.intp)
+        self.row_slot = np.concatenate([self.row_slot, slots])
+
+        blocks = [self.candidate_nodes(container) for container in containers]
+        sizes = [len(block) for block in blocks]
+        node = np.concatenate(blocks).astype(np.intp) if blocks else np.zeros(0, dtype=np.intp)
+        which = np.repeat(np.arange(count), sizes)
+        cpu = np.array([container.Ncore for container in containers], dtype=float)[which]
+        memory = np.array([container.mainMemory for container in containers], dtype=float)[which]
+        cols = np.arange(len(node))
+        on_cloud = np.flatnonzero(n['is_cloud'][node])
+        y = self.y_column[node[on_cloud]]
+        n_node = len(self.nodes)
+        self.add_columns(len(node),
+                         np.concatenate([first_row + which, node, n_node + node, self.usage_row[y], self.usage2_row[y]]),
+                         np.concatenate([np.ones(len(node)), cpu, memory, np.ones(len(on_cloud)), np.ones(len(on_cloud))]),
+                         np.concatenate([cols, cols, cols, on_cloud, on_cloud]))
+        self.col_slot = np.concatenate([self.col_slot, slots[which]])
+        self.col_node = np.concatenate([self.col_node, node])
+        self.col_cpu = np.concatenate([self.col_cpu, cpu])
+        self.col_memory = np.concatenate([self.col_memory, memory])
+
+    def column_containers(self):
+        """Index in self.containers of the container of every X column."""
+        index = np.full(self.next_slot, -1, dtype=np.intp)
+        index[[self.slots[container_key(container)] for container in self.containers]] = np.arange(len(self.containers))
+        return index[self.col_slot]
+
+    def feasibility(self):
+        """FeasibilityIndex of the current batch on the current node state."""
+        c = container_arrays(self.containers)
+        blocks = [self.candidate_nodes(container) for container in self.containers]
+        pair_node = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.intp)
+        pair_container = np.repeat(np.arange(len(blocks)), [len(b) for b in blocks])
+        # Edge nodes which are already activated cannot host new containers
+        keep = (self.n['activation'][pair_node] == 0) | c['is_cloud'][pair_container]
+        return FeasibilityIndex.from_pairs(self.containers, self.nodes, c, self.n,
+                                           pair_container[keep], pair_node[keep])
+
+    def start_solution(self, theta_risk, theta_el, col_container):
+        """Column values of the greedy assignment of warm_start.py, and whether it places every container."""
+        fi = self.feasibility()
+        counts, complete = greedy_start(fi, self.cloud_containers, self.edge_containers, theta_risk, theta_el)
+        chosen = np.flatnonzero(counts > 0)
+        n_node = len(self.nodes)
+        keys = col_container * n_node + self.col_node
+        order = np.argsort(keys)
+        cols = order[np.searchsorted(keys[order], fi.pair_container[chosen] * n_node + fi.pair_node[chosen])]
+        x = np.zeros(len(self.cloud_nodes) + len(self.col_node))
+        x[len(self.cloud_nodes) + cols] = 1
+        used = np.unique(self.col_node[cols])
+        x[self.y_column[used[self.n['is_cloud'][used]]]] = 1
+        return x, complete
+
+    def apply_options(self, options):
+        """Settings of the SolverOptions on the HiGHS model (None keeps the HiGHS default)."""
+        highs = self.highs
+        highs.resetOptions()
+        highs.setOptionValue('output_flag', bool(options.msg))
+        if options.threads is not None:
+            highs.setOptionValue('threads', int(options.threads))
+        if options.gap is not None:
+            highs.setOptionValue('mip_rel_gap', float(options.gap))
+        if options.time_limit is not None:
+            highs.setOptionValue('time_limit', float(options.time_limit))
+        if not options.presolve:
+            highs.setOptionValue('presolve', 'off')
+
+    def solve(self, theta_risk=0.5, theta_el=0.5, msg=False, options=None, warm_start=False):
+        """Synchronize the node state into the live model, re-optimize it and return a MatrixSolution."""
+        if options is None:
+            options = SolverOptions(msg=msg)
+        start = time()
+        self.update_nodes()
+        n = self.n
+        highs = self.highs
+        n_node = len(self.nodes)
+        n_cloud = len(self.cloud_nodes)
+        n_x = len(self.col_node)
+
+        # Residual capacities
+        highs.changeRowsBounds(2*n_node, np.arange(2*n_node, dtype=np.int32), np.full(2*n_node, -highspy.kHighsInf),
+                               np.concatenate([n['Ncore'], n['mainMemory']]))
+        # X columns of the containers which do not fit the node, or on an activated edge node: fixed to 0
+        node = self.col_node
+        upper = ((n['Ncore'][node] >= self.col_cpu) & (n['mainMemory'][node] >= self.col_memory)
+                 & (n['is_cloud'][node] | (n['activation'][node] == 0))).astype(float)
+        highs.changeColsBounds(n_x, np.arange(n_cloud, n_cloud + n_x, dtype=np.int32), np.zeros(n_x), upper)
+        # Costs, normalized over the containers of the batch
+        c = container_arrays(self.containers)
+        col_container = self.column_containers()
+        self.normalizers = objective_normalizers(self.infra, c, n)
+        components = cost_components(self.infra, c, n, col_container, node, self.cloud_nodes, self.normalizers,
+                                     self.cloud_containers, self.edge_containers)
+        cost = weighted_objective(components, theta_risk, theta_el)
+        cost[:n_x] = np.where(upper > 0, cost[:n_x], 0)
+        highs.changeColsCost(n_cloud + n_x, np.arange(n_cloud + n_x, dtype=np.int32),
+                             np.concatenate([cost[n_x:], cost[:n_x]]))
+
+        self.apply_options(options)
+        x_start = None
+        if warm_start:
+            greedy = time()
+            x_start, complete = self.start_solution(theta_risk, theta_el, col_container)
+            start_time = time() - greedy
+            solution = highspy.HighsSolution()
+            solution.col_value = x_start.tolist()
+            highs.setSolution(solution)
+        highs.run()
+
+        model_status = highs.getModelStatus()
+        found = highs.getInfo().primal_solution_status == highspy.kSolutionStatusFeasible
+        if model_status in (highspy.HighsModelStatus.kOptimal, highspy.HighsModelStatus.kModelEmpty):
+            status = LpStatusOptimal
+        elif model_status in (highspy.HighsModelStatus.kInfeasible, highspy.HighsModelStatus.kUnboundedOrInfeasible):
+            status = LpStatusInfeasible
+        elif found:
+            # Stopped (e.g. time limit) with an integer solution, as read_cbc_solution
+            status = LpStatusOptimal
+        else:
+            status = LpStatusNotSolved
+
+        # Solution as a MatrixModel of the chosen pairs, with the coefficients of the full batch
+        container_node = np.full(len(self.containers), -1, dtype=np.intp)
+        if status == LpStatusOptimal:
+            x = np.asarray(highs.getSolution().col_value)[n_cloud:]
+            chosen = np.flatnonzero(x > 0.5)
+            container_node[col_container[chosen]] = node[chosen]
+        assigned = np.flatnonzero(container_node >= 0)
+        feasibility = FeasibilityIndex.from_pairs(self.containers, self.nodes, c, {key: values.copy() for key, values in n.items()},
+                                                  assigned, container_node[assigned])
+        self.model = MatrixModel(None, self.infra, self.cloud_containers, self.edge_containers,
+                                 feasibility=feasibility, normalizers=self.normalizers)
+        solution = MatrixSolution(self.model, status, np.ones(self.model.nCol), time() - start, theta_risk, theta_el)
+        if status == LpStatusOptimal:
+            solution.gap = highs.getInfo().mip_gap
+        if x_start is not None:
+            solution.start_objective = float(np.concatenate([cost[n_x:], cost[:n_x]]) @ x_start)
+            solution.start_complete = complete
+            solution.start_time = start_time
+        return solution
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Node aggregation preprocessor for the container-node assignment ILP.
+
+Nodes with the same type, region, activation and free resources whose risk
+and electricity price fall in the same bucket (of width risk_step and
+eprice_step) are merged into a node class. The ILP is solved on the classes
+(matrix_model.MatrixModel with node_multiplicity), the containers assigned
+to a class are packed onto its nodes (first fit decreasing) and the few
+containers which do not fit are placed by a small exact model on the
+residual infrastructure. The resulting assignment is evaluated with the
+exact coefficients of the real nodes, so that the objective loss with
+respect to the exact model can be reported.
+
+risk_step and eprice_step are the speed/accuracy knob: 0 only merges
+identical nodes (no loss), larger values give fewer classes.
+"""
+from time import time
+
+import numpy as np
+from pulp import LpStatusOptimal, LpStatusInfeasible
+
+from feasibility import FeasibilityIndex, container_arrays, node_arrays
+from matrix_model import MatrixModel, evaluate_assignment
+
+
+class NodeClass:
+    """Node of the compact model, standing for the nodes of a class."""
+
+    def __init__(self, index, nodes, members):
+        first = nodes[members[0]]
+        self.id = index
+        self.type = first.type
+        self.region = first.region
+        self.power = first.power
+        self.activation = first.activation
+        # Capacities of the whole class
+        self.Ncore = first.Ncore * len(members)
+        self.mainMemory = first.mainMemory * len(members)
+        # Highest risk of the class for the prefiltering, so that every node of
+        # the class is admissible for the containers assigned to it
+        self.risk = max(nodes[j].risk for j in members)
+        self.mean_risk = float(np.mean([nodes[j].risk for j in members]))
+        self.eprice = float(np.mean([nodes[j].eprice for j in members]))
+        self.members = members
+
+
+def node_classes(nodes, risk_step=0.05, eprice_step=0.005):
+    """Group the nodes in classes; returns one array of node indices per class."""
+    n = node_arrays(nodes)
+    risk_bucket = np.floor(n['risk'] / risk_step) if risk_step > 0 else n['risk']
+    eprice_bucket = np.floor(n['eprice'] / eprice_step) if eprice_step > 0 else n['eprice']
+    classes = {}
+    keys = zip(n['type'], n['region'].tolist(), n['activation'].tolist(), n['Ncore'].tolist(),
+               n['mainMemory'].tolist(), risk_bucket.tolist(), eprice_bucket.tolist())
+    for j, key in enumerate(keys):
+        classes.setdefault(key, []).append(j)
+    return [np.array(members, dtype=np.intp) for members in classes.values()]
+
+
+class NodeClassModel:
+    """Compact ILP over node classes, with the same solve() interface as MatrixModel."""
+
+    def __init__(self, appl, infra, cloud_containers, edge_containers, risk_step=0.05, eprice_step=0.005, compare=False):
+        self.appl = appl
+        self.compare = compare
+        self.infra = infra
+        self.cloud_containers = cloud_containers
+        self.edge_containers = edge_containers
+        self.n = node_arrays(infra.nodeList)
+        self.classes = node_classes(infra.nodeList, risk_step, eprice_step)
+        class_nodes = [NodeClass(k, infra.nodeList, members) for k, members in enumerate(self.classes)]
+
+        feasibility = FeasibilityIndex(appl.containerList, class_nodes)
+        # The objective uses the average risk of the class
+        feasibility.n['risk'] = np.array([node.mean_risk for node in class_nodes])
+        self.model = MatrixModel(appl, infra, cloud_containers, edge_containers, feasibility=feasibility,
+                                 node_multiplicity=np.array([len(members) for members in self.classes], dtype=float))
+
+    def solve(self, theta_risk=0.5, theta_el=0.5, msg=False, compare=None, options=None, warm_start=False):
+        """
+        Solve the compact model and unpack it on the real nodes. The returned
+        MatrixSolution holds the exact objective of the unpacked assignment,
+        plus approx_objective (objective of the compact model) and, with
+        compare=True (default: the compare of the model), exact_objective
+        and objective_loss.
+        """
+        if compare is None:
+            compare = self.compare
+        start = time()
+        compact = self.model.solve(theta_risk, theta_el, msg=msg, options=options, warm_start=warm_start)
+        if compact.status != LpStatusOptimal:
+            return compact
+        container_node = self.unpack(compact.assignment)
+
+        status = compact.status
+        left = np.flatnonzero(container_node < 0)
+        if len(left):
+            status = self.repair(container_node, left, theta_risk, theta_el, msg, options)
+
+        solution = evaluate_assignment(self.appl, self.infra, self.cloud_containers, self.edge_containers,
+                                       self.n, container_node, status, theta_risk, theta_el)
+        solution.solutionTime = time() - start
+        solution.approx_objective = compact.objective
+        solution.exact_objective = None
+        solution.objective_loss = None
+        if compare:
+            exact = MatrixModel(self.appl, self.infra, self.cloud_containers, self.edge_containers).solve(theta_risk, theta_el, msg=msg, options=options)
+            solution.exact_objective = exact.objective
+            solution.objective_loss = solution.objective - exact.objective
+        return solution
+
+    def unpack(self, assignment):
+        """Node index of every container (-1 if it does not fit on the nodes of its class)."""
+        c = container_arrays(self.appl.containerList)
+        self.free_cpu = self.n['Ncore'].copy()
+        self.free_mem = self.n['mainMemory'].copy()
+        container_node = np.full(len(self.appl.containerList), -1, dtype=np.intp)
+
+        # First fit decreasing, class by class
+        order = np.lexsort((-c['Ncore'][assignment.container_index], assignment.node_index))
+        for i, k in zip(assignment.container_index[order].tolist(), assignment.node_index[order].tolist()):
+            members = self.classes[k]
+            fits = np.flatnonzero((self.free_cpu[members] >= c['Ncore'][i]) & (self.free_mem[members] >= c['mainMemory'][i]))
+            if len(fits):
+                j = members[fits[0]]
+                container_node[i] = j
+                self.free_cpu[j] -= c['Ncore'][i]
+                self.free_mem[j] -= c['mainMemory'][i]
+        return container_node
+
+    def repair(self, container_node, left, theta_risk, theta_el, msg, options=None):
+        """Place the containers left out by the unpacking with an exact model on the residual nodes."""
+        containers = [self.appl.containerList[i] for i in left.tolist()]
+        used = np.zeros(len(self.n['activation']), dtype=bool)
+        used[container_node[container_node >= 0]] = True
+        # Residual capacities; the nodes used by the unpacking are already active
+        # (so the edge nodes taken are not candidates any more)
+        n = dict(self.n, Ncore=self.free_cpu, mainMemory=self.free_mem,
+                 activation=np.maximum(self.n['activation'], used))
+        feasibility = FeasibilityIndex.from_arrays(containers, self.infra.nodeList, container_arrays(containers), n)
+        repair = MatrixModel(None, self.infra, self.cloud_containers, self.edge_containers,
+                             feasibility=feasibility, normalizers=self.model.normalizers).solve(theta_risk, theta_el, msg=msg, options=options)
+        if repair.status != LpStatusOptimal:
+            return LpStatusInfeasible
+        container_node[left[repair.assignment.container_index]] = repair.assignment.node_index
+        return LpStatusOptimal
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Archive of the non-dominated points of a bi-objective front (f_risk, f_el),
+both minimized.
+
+The points are kept sorted by increasing f_risk, hence with strictly
+decreasing f_el, in blocks of at most 2*block_load points (as the leaves of a
+B-tree). A new point is found by bisection on the last f_risk of each block
+and then within its block; it is rejected if a point of the archive
+dominates or equals it, otherwise the points that it dominates (a
+contiguous run after its position, possibly over several blocks) are
+removed. An insertion thus costs O(log n) comparisons plus the shift of at
+most 2*block_load items of one block, instead of the O(n) shift of a single
+sorted list (each removed point is visited once). Each point carries a
+payload (e.g. its weights and solver values). Archives can be merged
+(parallel workers, earlier runs) and saved to a file. Points without
+objective values (a run without a result) are never inserted, so that they
+cannot evict the points of a front.
+"""
+import os
+import pickle
+from bisect import bisect_left
+from itertools import chain
+
+import numpy as np
+
+
+def count_dominated(f_el, start, value):
+    """Number of the points from start on with f_el >= value (f_el is decreasing)."""
+    end = start
+    while end < len(f_el) and f_el[end] >= value:
+        end += 1
+    return end - start
+
+
+class ParetoArchive:
+    block_load = 500 # points of a block after a split
+
+    def __init__(self, points=()):
+        # f_risk, f_el and payload of the points of each block, last f_risk of each block
+        self.f_risk = []
+        self.f_el = []
+        self.payload = []
+        self.maxes = []
+        self.size = 0
+        self.update(points)
+
+    def add(self, f_risk, f_el, data=None):
+        """Insert the point unless it is dominated or has no objective value (None or NaN); returns True if inserted."""
+        if f_risk is None or f_el is None:
+            return False
+        f_risk, f_el = float(f_risk), float(f_el)
+        if np.isnan(f_risk) or np.isnan(f_el):
+            return False
+        if not self.maxes:
+            self.f_risk, self.f_el, self.payload, self.maxes = [[f_risk]], [[f_el]], [[data]], [f_risk]
+            self.size = 1
+            return True
+        # Block b and position i of the first point with f_risk >= the new one (or the end)
+        b = min(bisect_left(self.maxes, f_risk), len(self.maxes) - 1)
+        risk, el = self.f_risk[b], self.f_el[b]
+        i = bisect_left(risk, f_risk)
+        # Dominated by (or equal to) a point with lower or the same f_risk
+        previous = el[i - 1] if i > 0 else self.f_el[b - 1][-1] if b > 0 else None
+        if previous is not None and previous <= f_el:
+            return False
+        if i < len(risk) and risk[i] == f_risk and el[i] <= f_el:
+            return False
+        # Points dominated by the new one: the end of block b, whole blocks, the start of the next one
+        j = i + count_dominated(el, i, f_el)
+        removed = j - i
+        if j == len(el):
+            k = b + 1
+            while k < len(self.maxes) and self.f_el[k][-1] >= f_el:
+                k += 1
+            removed += sum(len(block) for block in self.f_el[b + 1:k])
+            for blocks in (self.f_risk, self.f_el, self.payload, self.maxes):
+                del blocks[b + 1:k]
+            if b + 1 < len(self.maxes):
+                m = count_dominated(self.f_el[b + 1], 0, f_el)
+                for blocks in (self.f_risk, self.f_el, self.payload):
+                    del blocks[b + 1][:m]
+                removed += m
+        risk[i:j] = [f_risk]
+        el[i:j] = [f_el]
+        self.payload[b][i:j] = [data]
+        self.maxes[b] = risk[-1]
+        self.size += 1 - removed
+        # Split a block grown over 2*block_load points
+        if len(risk) > 2 * self.block_load:
+            for blocks in (self.f_risk, self.f_el, self.payload):
+                block = blocks[b]
+                blocks[b:b + 1] = [block[:self.block_load], block[self.block_load:]]
+            self.maxes[b:b + 1] = [self.f_risk[b][-1], self.f_risk[b + 1][-1]]
+        return True
+
+    def update(self, points):
+        """Add the (f_risk, f_el, data) points; returns the number inserted."""
+        return sum(self.add(*point) for point in points)
+
+    def merge(self, other):
+        """Add the points of another archive."""
+        self.update(other)
+        return self
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """(f_risk, f_el, data) by increasing f_risk."""
+        return chain.from_iterable(zip(*block) for block in zip(self.f_risk, self.f_el, self.payload))
+
+    def __repr__(self):
+        return f'ParetoArchive({len(self)} points)'
+
+    def points(self):
+        """Array of the (f_risk, f_el) points by increasing f_risk."""
+        if not self.size:
+            return np.empty((0, 2))
+        return np.column_stack((np.concatenate(self.f_risk), np.concatenate(self.f_el)))
+
+    def data(self):
+        return list(chain.from_iterable(self.payload))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(list(self), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """Archive saved in path (empty if the file does not exist)."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'rb') as f:
+            return cls(pickle.load(f))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Weighted-sum ILP of the Pareto front sweep (bin/pareto_front_main.py).
+
+Differences with the model of ilp_solver.main: every node has a usage
+variable Y, the cloud electricity cost is relative to the cores of the node
+and the activation cost does not depend on the current activation.
+"""
+from pulp import LpProblem, LpMinimize, LpVariable, LpStatusOptimal, lpSum, value
+
+from solver_backend import pulp_solver
+
+
+class ParetoModel:
+    """
+    Parametric model of the sweep: the variables, the constraints and the two
+    normalized cost functions f_risk and f_el are built once, each point only
+    sets the objective theta_el * f_el + theta_risk * f_risk. The solution of
+    the previous point is given to the solver as MIP start.
+    """
+
+    def __init__(self, appl, infra, feasibility, cloud_containers, edge_containers):
+        valid_pairs = feasibility.valid_pairs()
+
+        # Create a new ILP problem instance
+        problem = LpProblem("Container_Node_Assignment", LpMinimize)
+
+        # Define decision variables
+        decision_vars = { (container, node): LpVariable(f'X_{container.id}_{node.id}', cat='Binary')
+                          for container, nodes in valid_pairs.items() for node in nodes }
+        node_usage = { node: LpVariable(f'Y_{node.id}', cat='Binary') for node in infra.nodeList }
+
+        # Constraints: ensure each container is assigned to exactly one node
+        for container in appl.containerList:
+            problem += lpSum(decision_vars[(container, node)] for node in valid_pairs[container]) == 1, f"unicity_{container.id}"
+
+        # Node capacity constraints (CPU and memory) and node usage constraints
+        for j, node in enumerate(infra.nodeList):
+            valid_containers = [appl.containerList[i] for i in feasibility.containers_for(j)]
+            problem += lpSum(decision_vars[(container, node)] * container.Ncore for container in valid_containers) <= node.Ncore, f"CPU_{node.id}"
+            problem += lpSum(decision_vars[(container, node)] * container.mainMemory for container in valid_containers) <= node.mainMemory, f"memory_{node.id}"
+            problem += lpSum(decision_vars[(container, node)] for container in valid_containers) <= node_usage[node] * len(valid_containers), f"NodeUsage_{node.id}"
+            problem += lpSum(decision_vars[(container, node)] for container in valid_containers) >= node_usage[node], f"NodeUsage2_{node.id}"
+
+        # Objective Function
+        risk_terms_edge = [decision_vars[(container, node)] * node.risk for container, node in decision_vars if node.type == 'edge-cpu']
+        risk_terms_cloud = [decision_vars[(container, node)] * node.risk for container, node in decision_vars if node.type == 'cloud-cpu']
+
+        el_terms_edge = [decision_vars[(container, node)] * (node.power/1000 * node.eprice * container.Ncore / node.Ncore) for container, node in decision_vars if node.type == 'edge-cpu']
+        el_terms_cloud = [decision_vars[(container, node)] * 0.5*(node.power/1000 * node.eprice * container.Ncore / node.Ncore) for container, node in decision_vars if node.type == 'cloud-cpu']
+        el_terms_act = [node_usage[node] * node.power / 1000 * node.eprice * 0.5 for node in infra.nodeList if node.type == 'cloud-cpu']
+
+        P_cloud, P_edge = infra.power_consumption()
+        max_el_cloud = sum(P_cloud/1000 * 0.5*infra.max_eprice()*container.Ncore/128 for container in appl.containerList if container.nodeType == 'cloud-cpu')
+        max_el_edge  = sum(P_edge/1000 * infra.max_eprice()  for container in appl.containerList if container.nodeType == 'edge-cpu')
+        max_el_act  = sum(node.power/1000 * infra.max_eprice()*0.5 for node in infra.nodeList if node.type == 'cloud-cpu')
+
+        max_risk_cloud, max_risk_edge = infra.max_risk()
+
+        self.f_risk_edge = (lpSum(risk_terms_edge)) / (edge_containers*max_risk_edge)
+        self.f_risk_cloud = lpSum(risk_terms_cloud) / (cloud_containers*max_risk_cloud)
+
+        self.f_risk = (self.f_risk_cloud+self.f_risk_edge)/2
+
+        self.f_el_edge = (lpSum(el_terms_edge)) / (max_el_edge)
+        self.f_el_cloud = (lpSum(el_terms_cloud)) / (max_el_cloud)
+        self.f_el_act = (lpSum(el_terms_act)) / (max_el_act)
+
+        self.f_el = (self.f_el_cloud + self.f_el_edge+self.f_el_act)/3
+
+        self.problem = problem
+        self.solved = False
+
+    def solve(self, theta_risk, theta_el, solver=None, warm_start=True):
+        """
+        Solve the model for the weights theta_risk and theta_el.
+        Returns the solver status and the normalized values
+        (f_risk, f_el, f_risk_edge, f_el_edge, f_risk_cloud, f_el_cloud), None if infeasible.
+        """
+        # Objective: weighted sum of the two normalized functions.
+        self.problem.setObjective(theta_el * self.f_el + theta_risk * self.f_risk)
+
+        # The variables still hold the solution of the previous point
+        self.problem.solve(pulp_solver(solver, warm_start=warm_start and self.solved))
+        self.solved = self.problem.status == LpStatusOptimal
+        # Return the obtained normalized objective values (if infeasible, they will be None)
+        return self.problem.status, (value(self.f_risk), value(self.f_el), value(self.f_risk_edge),
+                                     value(self.f_el_edge), value(self.f_risk_cloud), value(self.f_el_cloud))
+
+
+def solve_weighted(appl, infra, feasibility, theta_risk, theta_el, cloud_containers, edge_containers, solver=None):
+    """
+    Build and solve the ILP with a weighted sum objective defined by theta_risk and theta_el
+    (single point, see ParetoModel.solve for the returned values).
+    """
+    return ParetoModel(appl, infra, feasibility, cloud_containers, edge_containers).solve(theta_risk, theta_el, solver)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive generation of a bi-objective Pareto front with weighted sums.
+
+Instead of a fixed grid of weights, the front is started from the two
+extreme points (theta_risk = 0 and 1) and refined where it is coarsest:
+the pair of neighbouring points enclosing the largest hypervolume gap (the
+box |d f_risk| x |d f_el| between them) is split by solving at the weight
+whose objective is parallel to the segment joining them (dichotomic /
+NISE scheme, split='dichotomic') or at the midpoint of their weights
+(split='midpoint', for heuristics whose objectives are not the weighted
+functions, and as fallback when the dichotomic weight is not between the
+two weights). A segment for which no new point is found is not split
+again. The refinement stops when the largest gap is below the resolution
+(relative to the box of the extreme points) or the solve budget is spent.
+
+With round_size > 1, the round_size largest gaps are split at once and
+their weights are evaluated together by evaluate_many (e.g. in parallel
+processes); round_size=1 is the sequential refinement.
+
+The same driver works for the ILP (bin/pareto_front_main.py) and for the
+DES heuristic (event_simulator/pareto_front.py).
+"""
+import heapq
+
+
+def dichotomic_weight(a, b):
+    """theta_risk for which theta_risk*f_risk + (1-theta_risk)*f_el is equal at the points a and b."""
+    d_risk = a[0] - b[0]
+    d_el = b[1] - a[1]
+    if d_risk + d_el == 0:
+        return None
+    return d_el / (d_risk + d_el)
+
+
+def same_point(f, g, tol=1e-9):
+    return all(abs(x - y) <= tol * (1 + abs(x)) for x, y in zip(f, g))
+
+
+def refine_front(evaluate, objectives, max_solves=10, resolution=1e-3, min_step=1e-3, split='dichotomic',
+                 evaluate_many=None, round_size=1):
+    """
+    Adaptive weighted-sum front. evaluate(theta_risk) solves one point and
+    objectives(result) returns its (f_risk, f_el) (None if infeasible).
+    evaluate_many(thetas), if given, returns the results of a round in the
+    order of thetas (default: evaluate one after the other).
+    Returns the solved points as a list of (theta_risk, result) sorted by theta_risk.
+    """
+    points = {}
+    if evaluate_many is None:
+        evaluate_many = lambda thetas: [evaluate(theta) for theta in thetas]
+
+    def solve(thetas):
+        results = evaluate_many(thetas)
+        points.update(zip(thetas, results))
+        return [objectives(result) for result in results]
+
+    def split_weight(left, right):
+        theta = dichotomic_weight(left[1], right[1]) if split == 'dichotomic' else None
+        if theta is None or not left[0] < theta < right[0]:
+            theta = (left[0] + right[0]) / 2
+        return theta
+
+    ends = list(zip((0.0, 1.0), solve([0.0, 1.0])))
+    ends = [(theta, f) for theta, f in ends if f is not None]
+    if len(ends) < 2:
+        return sorted(points.items())
+    (_, fa), (_, fb) = ends
+    scale = abs(fa[0] - fb[0]) * abs(fa[1] - fb[1]) or 1.0
+
+    def push(heap, left, right):
+        gap = abs(left[1][0] - right[1][0]) * abs(left[1][1] - right[1][1]) / scale
+        if gap > resolution and right[0] - left[0] > min_step:
+            heapq.heappush(heap, (-gap, left, right))
+
+    # Segments ordered by decreasing gap, the largest ones split in each round
+    heap = []
+    push(heap, ends[0], ends[1])
+    while heap and len(points) < max_solves:
+        segments = [heapq.heappop(heap)[1:] for _ in range(min(round_size, len(heap), max_solves - len(points)))]
+        thetas = [split_weight(left, right) for left, right in segments]
+        for (left, right), theta, f in zip(segments, thetas, solve(thetas)):
+            if f is None:
+                continue
+            # No new point between the two neighbours: the segment is done
+            if same_point(f, left[1]) or same_point(f, right[1]):
+                continue
+            push(heap, left, (theta, f))
+            push(heap, (theta, f), right)
+    return sorted(points.items())
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel weight sweep of the Pareto front.
+
+The parsed application and infrastructure are sent once to each worker
+process (pool initializer), which builds its pareto_model.ParetoModel
+once; every worker then solves a contiguous block of weight points,
+re-weighting the objective and warm starting from its previous point, with
+the solver limited to its share of the cores. Results are yielded in the
+order of the weights as soon as they are available.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from feasibility import FeasibilityIndex
+from pareto_model import ParetoModel
+from solver_backend import SolverOptions
+
+# Data of the worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(appl, infra, cloud_containers, edge_containers, solver):
+    feasibility = FeasibilityIndex(appl.containerList, infra.nodeList)
+    _worker.update(solver=solver, model=ParetoModel(appl, infra, feasibility, cloud_containers, edge_containers))
+
+
+def _solve_point(theta_risk):
+    status, values = _worker['model'].solve(theta_risk, 1 - theta_risk, _worker['solver'])
+    return theta_risk, status, values
+
+
+def sweep(appl, infra, weights, cloud_containers, edge_containers, solver=None, processes=None):
+    """
+    Solve the weighted ILP for every theta_risk in weights (theta_el = 1 - theta_risk)
+    and yield (theta_risk, status, values) in order, values as returned by solve_weighted.
+    The cores are split among the processes (default: one per core, at most one per point).
+    """
+    weights = [float(w) for w in weights]
+    cores = os.cpu_count() or 1
+    if processes is None:
+        processes = min(cores, len(weights))
+    processes = max(1, processes)
+    solver = (solver or SolverOptions()).replace(threads=max(1, cores // processes))
+
+    # The sweep scripts run at module level, so the workers are forked
+    # instead of re-importing the main module
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork') if 'fork' in methods else None
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker,
+                             initargs=(appl, infra, cloud_containers, edge_containers, solver)) as pool:
+        # Contiguous blocks of points per worker: neighbouring points make good warm starts
+        yield from pool.map(_solve_point, weights, chunksize=math.ceil(len(weights) / processes))
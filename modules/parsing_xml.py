@@ -6,6 +6,9 @@ Created on Fri Nov 15 15:19:13 2024
 """
 
 import xml.etree.ElementTree as ET
+import numpy as np
+
+from sim_trace import tracer, DEBUG
 
 class Container:
     def __init__(self, container_data):
@@ -247,9 +250,10 @@ class Application:
         trimmed = [c for c in self.containerList if c.request_id == max_id]
         # Update ID for each trimmed container
         self.containerList = [c for c in self.containerList if c.request_id != max_id]
-        print(len(self.containerList))
         min_id = min(c.request_id for c in trimmed)
-        print('min_id',min_id)
+        if tracer.level <= DEBUG:
+            tracer.emit(DEBUG, 'trim', containers=len(self.containerList), min_id=min_id,
+                        message=f'{len(self.containerList)} containers left, min_id {min_id}')
         return trimmed, min_id
     
 
@@ -259,36 +263,84 @@ class Application:
         """
         self.containerList.extend(containers)
 
+def node_kind(node):
+    """'cloud' or 'edge' (None for other node types)."""
+    if 'cloud' in node.type:
+        return 'cloud'
+    if 'edge' in node.type:
+        return 'edge'
+    return None
+
+
+class InfrastructureStats:
+    """
+    Summary of the nodes used by the normalizations: risk and electricity
+    price extrema, node counts (per type and per region), capacity totals and
+    free-capacity aggregates. Risk and price never change; the free resources
+    and the number of active nodes are updated by the Infrastructure methods.
+    """
+    def __init__(self, nodeList):
+        kinds = ('cloud', 'edge')
+        by_kind = {kind: [node for node in nodeList if node_kind(node) == kind] for kind in kinds}
+        self.max_eprice = max((node.eprice for node in nodeList), default=None)
+        self.min_eprice = min((node.eprice for node in nodeList), default=None)
+        self.max_risk = {kind: max((node.risk for node in by_kind[kind]), default=None) for kind in kinds}
+        self.min_risk = {kind: min((node.risk for node in by_kind[kind]), default=None) for kind in kinds}
+        self.count = {kind: len(by_kind[kind]) for kind in kinds}
+        self.region_count = {}
+        for kind in kinds:
+            for node in by_kind[kind]:
+                self.region_count[(kind, node.region)] = self.region_count.get((kind, node.region), 0) + 1
+        self.total_cpu = {kind: sum(node.Ncore for node in by_kind[kind]) for kind in kinds}
+        self.total_memory = {kind: sum(node.mainMemory for node in by_kind[kind]) for kind in kinds}
+        self.free_cpu = dict(self.total_cpu)
+        self.free_memory = dict(self.total_memory)
+        self.active = {kind: sum(1 for node in by_kind[kind] if node.activation) for kind in kinds}
+
+    def update_resources(self, node, cpu_delta, mem_delta):
+        kind = node_kind(node)
+        if kind is not None:
+            self.free_cpu[kind] -= cpu_delta
+            self.free_memory[kind] -= mem_delta
+
+    def update_activation(self, node, old_value, new_value):
+        kind = node_kind(node)
+        if kind is not None and bool(old_value) != bool(new_value):
+            self.active[kind] += 1 if new_value else -1
+
+
 class Infrastructure:
     def __init__(self, xml_file):
         self.nodeList = parse_infrastructure_xml(xml_file)
+        self.xml_file = xml_file
+        # Position of each node in nodeList, by id
+        self.node_position = {node.id: position for position, node in enumerate(self.nodeList)}
+        # Ids of the nodes whose resources or activation changed (read by matrix_model.IncrementalModel)
+        self.modified_nodes = set()
+        self.refresh_stats()
+    
+    def refresh_stats(self):
+        """Recompute the statistics summary (needed only if nodeList is modified directly)."""
+        self.stats = InfrastructureStats(self.nodeList)
     
     def nNode(self):
         return len(self.nodeList)
     
     def max_eprice(self):
         """Calculate the maximum electricity price among the nodes."""
-        if not self.nodeList:
-            return None  # Handle empty node list case
-        return max(node.eprice for node in self.nodeList)
+        return self.stats.max_eprice  # None for an empty node list
     
     def min_eprice(self):
-        """Calculate the maximum electricity price among the nodes."""
-        if not self.nodeList:
-            return None  # Handle empty node list case
-        return min(node.eprice for node in self.nodeList)
+        """Calculate the minimum electricity price among the nodes."""
+        return self.stats.min_eprice  # None for an empty node list
     
     def max_risk(self):
         """Calculate the maximum risk for edge and cloud pods."""
-        max_cloud_risk = max(node.risk for node in self.nodeList if 'cloud' in node.type)         
-        max_edge_risk = max(node.risk for node in self.nodeList if 'edge' in node.type) 
-        return max_cloud_risk, max_edge_risk
+        return self.stats.max_risk['cloud'], self.stats.max_risk['edge']
 
     def min_risk(self):
-        """Calculate the maximum risk for edge and cloud pods."""
-        min_cloud_risk = min(node.risk for node in self.nodeList if 'cloud' in node.type)         
-        min_edge_risk = min(node.risk for node in self.nodeList if 'edge' in node.type) 
-        return min_cloud_risk, min_edge_risk
+        """Calculate the minimum risk for edge and cloud pods."""
+        return self.stats.min_risk['cloud'], self.stats.min_risk['edge']
 
     def power_consumption(self):
         
@@ -303,33 +355,36 @@ class Infrastructure:
         return Ncpu_cloud, Ncpu_edge
     
     def count_nodes(self):
-        cloud_count, edge_count = 0, 0
-        for node in self.nodeList:
-            if 'cloud' in node.type:
-                cloud_count += 1
-            elif 'edge' in node.type:
-                edge_count += 1
-        return cloud_count, edge_count
+        return self.stats.count['cloud'], self.stats.count['edge']
     
     def count_nodes_per_region(self, region):
-        cloud_count, edge_count = 0, 0
-        for node in self.nodeList:
-            if 'cloud' in node.type and region == node.region:
-                cloud_count += 1
-            elif 'edge' in node.type and region == node.region:
-                edge_count += 1
-        return cloud_count, edge_count
+        return self.stats.region_count.get(('cloud', region), 0), self.stats.region_count.get(('edge', region), 0)
+    
+    def free_resources(self):
+        """Free cores and memory of the cloud and edge nodes."""
+        return (self.stats.free_cpu['cloud'], self.stats.free_memory['cloud'],
+                self.stats.free_cpu['edge'], self.stats.free_memory['edge'])
+    
+    def count_active_nodes(self):
+        return self.stats.active['cloud'], self.stats.active['edge']
+    
+    def node_by_id(self, node_id):
+        """Return the node with the given `node_id`, or None if no such node exists."""
+        position = self.node_position.get(node_id)
+        return None if position is None else self.nodeList[position]
     
     def set_node_activation(self, node_id, new_value):
         """
         Find the node with the given `node_id` and set its activation.
         Returns True if successful, False if no such node exists.
         """
-        for node in self.nodeList:
-            if node.id == node_id:
-                node.activation = new_value
-                return True
-        return False
+        node = self.node_by_id(node_id)
+        if node is None:
+            return False
+        self.stats.update_activation(node, node.activation, new_value)
+        node.activation = new_value
+        self.modified_nodes.add(node_id)
+        return True
     
     def update_node_resources(self, node_id, cpu_delta, mem_delta):
         """
@@ -337,15 +392,54 @@ class Infrastructure:
         memory (mem_delta) from the node's available resources.
         Raises ValueError if the node doesn't exist or resources would go negative.
         """
-        for node in self.nodeList:
-            if node.id == node_id:
-                if node.Ncore < cpu_delta or node.mainMemory < mem_delta:
-                    print('Available', node.Ncore, node.mainMemory, 'requested', cpu_delta, mem_delta )
-                    raise ValueError(f"Not enough resources on node {node_id}")
-                node.Ncore -= cpu_delta
-                node.mainMemory -= mem_delta
-                return True
-        raise ValueError(f"Node {node_id} not found")
+        node = self.node_by_id(node_id)
+        if node is None:
+            raise ValueError(f"Node {node_id} not found")
+        if node.Ncore < cpu_delta or node.mainMemory < mem_delta:
+            print('Available', node.Ncore, node.mainMemory, 'requested', cpu_delta, mem_delta )
+            raise ValueError(f"Not enough resources on node {node_id}")
+        node.Ncore -= cpu_delta
+        node.mainMemory -= mem_delta
+        self.stats.update_resources(node, cpu_delta, mem_delta)
+        self.modified_nodes.add(node_id)
+        return True
+    
+    def apply_assignment(self, node_ids, cpu, mem, activation=None):
+        """
+        Deduct the resources of many pods at once. node_ids, cpu and mem have one
+        entry per pod (negative values release resources); the deltas are summed
+        per node before being applied. If activation is given, it is set on every
+        node involved. Raises ValueError (and changes nothing) if a node doesn't
+        exist or its resources would go negative.
+        """
+        node_ids = np.asarray(node_ids, dtype=int)
+        if len(node_ids) == 0:
+            return True
+        ids, inverse = np.unique(node_ids, return_inverse=True)
+        cpu_delta = np.bincount(inverse, weights=np.asarray(cpu, dtype=float), minlength=len(ids))
+        mem_delta = np.bincount(inverse, weights=np.asarray(mem, dtype=float), minlength=len(ids))
+        nodes = [self.node_by_id(node_id) for node_id in ids.tolist()]
+        if None in nodes:
+            raise ValueError(f"Node {ids[nodes.index(None)]} not found")
+        available_cpu = np.array([node.Ncore for node in nodes], dtype=float)
+        available_mem = np.array([node.mainMemory for node in nodes], dtype=float)
+        short = np.flatnonzero((available_cpu < cpu_delta) | (available_mem < mem_delta))
+        if len(short):
+            k = short[0]
+            print('Available', available_cpu[k], available_mem[k], 'requested', cpu_delta[k], mem_delta[k])
+            raise ValueError(f"Not enough resources on node {ids[k]}")
+        for node, d_cpu, d_mem in zip(nodes, cpu_delta.tolist(), mem_delta.tolist()):
+            # Keep integer resources integer
+            d_cpu = int(d_cpu) if d_cpu.is_integer() else d_cpu
+            d_mem = int(d_mem) if d_mem.is_integer() else d_mem
+            node.Ncore -= d_cpu
+            node.mainMemory -= d_mem
+            self.stats.update_resources(node, d_cpu, d_mem)
+            if activation is not None:
+                self.stats.update_activation(node, node.activation, activation)
+                node.activation = activation
+        self.modified_nodes.update(ids.tolist())
+        return True
 
         
 
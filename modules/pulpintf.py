@@ -63,8 +63,19 @@ class PulpInterface:
     def defObjective(self, s):
         self.script.append("prob += %s" % (s))
 
-    def callSolver(self):
-        self.script.append("status = prob.solve(P.GLPK(msg = 0))")
+    def callSolver(self, options=None):
+        """
+        Solve with GLPK, or with the solver described by a
+        solver_backend.SolverOptions.
+        """
+        if options is None:
+            self.script.append("status = prob.solve(P.GLPK(msg = 0))")
+        else:
+            # The generated script may run from anywhere: solver_backend is found next to this module
+            self.script.append("import sys")
+            self.script.append("sys.path.append(%r)" % (os.path.dirname(os.path.abspath(__file__))))
+            self.script.append("import solver_backend")
+            self.script.append("status = prob.solve(solver_backend.pulp_solver(solver_backend.%r))" % (options))
         self.script.append("print(P.LpStatus[status])")
 
     def prValues(self):
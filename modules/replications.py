@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Independent replications of a stochastic simulation.
+
+replicate(i) runs replication i with its own random stream (see
+replication_seed) and returns its metrics as a dict of numbers. The
+replications are run in parallel by rounds of one per worker process, and
+stop at max_replications or, once min_replications are done, as soon as
+the confidence interval of the mean of every monitored metric is narrower
+than the requested precision (half-width relative to the mean). Since the
+stopping test is only made between rounds, the results depend on the seed
+and the number of processes, not on the order in which the workers finish.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+
+def replication_seed(seed, index, words=8):
+    """State for np.random.seed of replication index: independent streams for the same seed."""
+    return np.random.SeedSequence(seed, spawn_key=(index,)).generate_state(words)
+
+
+def t_cdf(t, df):
+    """Distribution function of the Student t distribution with integer df degrees of freedom (closed form)."""
+    theta = math.atan(t / math.sqrt(df))
+    c2 = math.cos(theta)**2
+    if df % 2:
+        term, total = math.cos(theta), 0.0
+        for k in range(1, (df - 1)//2 + 1):
+            total += term
+            term *= c2 * 2*k / (2*k + 1)
+        central = 2/math.pi * (theta + math.sin(theta)*total) if df > 1 else 2/math.pi * theta
+    else:
+        term, total = 1.0, 0.0
+        for k in range(1, df//2 + 1):
+            total += term
+            term *= c2 * (2*k - 1) / (2*k)
+        central = math.sin(theta) * total
+    return (1 + central) / 2
+
+
+def t_quantile(p, df):
+    """
+    Quantile p of the Student t distribution with integer df degrees of
+    freedom: Cornish-Fisher expansion in 1/df, refined by Newton steps.
+    """
+    z = NormalDist().inv_cdf(p)
+    g1 = (z**3 + z) / 4
+    g2 = (5*z**5 + 16*z**3 + 3*z) / 96
+    g3 = (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / 384
+    g4 = (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z) / 92160
+    t = z + g1/df + g2/df**2 + g3/df**3 + g4/df**4
+    log_norm = math.lgamma((df + 1)/2) - math.lgamma(df/2) - 0.5*math.log(df*math.pi)
+    for _ in range(20):
+        density = math.exp(log_norm - (df + 1)/2 * math.log1p(t*t/df))
+        step = (t_cdf(t, df) - p) / density
+        t -= step
+        if abs(step) <= 1e-12 * (1 + abs(t)):
+            break
+    return t
+
+
+def mean_interval(values, confidence=0.95):
+    """Mean, half-width of its confidence interval (nan for a single value) and standard deviation."""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = float(values.mean())
+    if n < 2:
+        return mean, math.nan, math.nan
+    std = float(values.std(ddof=1))
+    return mean, t_quantile((1 + confidence) / 2, n - 1) * std / math.sqrt(n), std
+
+
+def summarize(runs, confidence=0.95):
+    """{metric: (mean, half-width, std)} over the replications (list of metric dicts)."""
+    return {key: mean_interval([run[key] for run in runs], confidence) for key in runs[0]}
+
+
+def precise(summary, keys, precision):
+    """True if the half-width of every metric of keys is within precision times its mean."""
+    for key in keys:
+        mean, half_width, _ = summary[key]
+        if not half_width <= precision * abs(mean):
+            return False
+    return True
+
+
+def run_replications(replicate, max_replications, min_replications=5, precision=None, keys=None,
+                     confidence=0.95, processes=None):
+    """
+    Metrics of the replications replicate(0), replicate(1), ... (see the
+    module docstring); keys: metrics monitored for the precision (default all).
+    The workers are forked, so replicate may use the data of the parent.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, max_replications))
+    pool = None
+    if processes > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork'))
+    runs = []
+    try:
+        while len(runs) < max_replications:
+            size = max(processes, min_replications - len(runs))
+            batch = range(len(runs), min(len(runs) + size, max_replications))
+            runs.extend(pool.map(replicate, batch) if pool is not None else map(replicate, batch))
+            if precision is not None and len(runs) >= max(min_replications, 2):
+                if precise(summarize(runs, confidence), keys or list(runs[0]), precision):
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return runs
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk, content-addressed store of solve results.
+
+Results are kept in a SQLite database (by default data/output/result_cache.sqlite)
+under a key which is the hash of the content of the inputs (XML files,
+source files of the model, or the state of the containers and nodes in
+memory) and of the parameters of the solve (theta, solver settings, ...).
+Changing any input or parameter gives a new key, so stale results are
+never returned; repeated analyses reuse the earlier solves.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+from time import time
+
+from feasibility import container_arrays, node_arrays
+from assignment import Assignment
+from matrix_model import SolutionVariable
+
+DEFAULT_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'output', 'result_cache.sqlite'))
+
+# Digests of the files already read, by (path, modification time, size)
+_file_digests = {}
+
+
+def file_digest(path):
+    """SHA-256 of the content of a file."""
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _file_digests.get(signature)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = _file_digests[signature] = h.hexdigest()
+    return digest
+
+
+def state_digest(containers, nodes):
+    """SHA-256 of the ids and attributes of the containers and nodes (current resources included)."""
+    h = hashlib.sha256()
+    for objects, arrays in ((containers, container_arrays(containers)), (nodes, node_arrays(nodes))):
+        h.update(repr([obj.id for obj in objects]).encode())
+        for name in sorted(arrays):
+            values = arrays[name]
+            h.update(name.encode())
+            h.update('\0'.join(map(str, values.tolist())).encode() if values.dtype == object else values.tobytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                    "(key TEXT PRIMARY KEY, kind TEXT, created REAL, value BLOB)")
+
+    def key(self, kind, files=(), digests=(), **params):
+        """
+        Key of a result: kind of solve, content of the given files, other
+        content digests (e.g. state_digest) and parameters (JSON serializable
+        or with a stable repr).
+        """
+        content = {'kind': kind,
+                   'files': [file_digest(path) for path in files],
+                   'digests': list(digests),
+                   'params': params}
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=repr).encode()).hexdigest()
+
+    def get(self, key):
+        """Stored result, or None."""
+        row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key, value, kind=None):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                    (key, kind, time(), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def cached(self, key, compute, kind=None):
+        """Stored result of key, computing (and storing) it with compute() if missing."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value, kind)
+        return value
+
+    def clear(self, kind=None):
+        """Remove all the results (of the given kind)."""
+        with self.connection:
+            if kind is None:
+                self.connection.execute("DELETE FROM results")
+            else:
+                self.connection.execute("DELETE FROM results WHERE kind = ?", (kind,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class CachedSolution:
+    """
+    Solution of ilp_solver.main restored from the cache, with the attributes
+    used by the callers (status, solutionTime, report, assignment, variables()).
+    """
+
+    def __init__(self, record, containers, nodes):
+        self.status = record['status']
+        self.solutionTime = record['solutionTime']
+        self.report = record['report']
+        self.assignment = Assignment(containers, nodes, record['container_index'], record['node_index'],
+                                     record['cpu'], record['memory'], record['status'], record['objective'],
+                                     record['components'])
+        self.objective = record['objective']
+        self._variables = [SolutionVariable(name, 1.0) for name in record['variables']]
+
+    @staticmethod
+    def record(solution):
+        """Data of a solution to be stored in the cache."""
+        assignment = solution.assignment
+        return {'status': solution.status, 'solutionTime': solution.solutionTime, 'report': solution.report,
+                'variables': [var.name for var in solution.variables() if var.varValue == 1],
+                'container_index': assignment.container_index, 'node_index': assignment.node_index,
+                'cpu': assignment.cpu, 'memory': assignment.memory,
+                'objective': assignment.objective, 'components': assignment.components}
+
+    def variables(self):
+        """Decision variables equal to 1."""
+        return self._variables
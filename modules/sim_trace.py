@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Event trace of the simulators.
+
+Each event is a record (simulated time, kind, pod id, node id and other
+fields) emitted at a level; records below the level of the tracer are
+dropped at the first test, and the others can be sampled. The kept records
+are buffered and written in blocks to an NDJSON file (one JSON object per
+line, see read_trace to replay it) and/or echoed to the terminal.
+
+The tracer of the process is `tracer`, off by default; the scripts set it
+up with configure(). On hot paths, test `tracer.level <= INFO` before
+building the message of an event.
+"""
+import atexit
+import json
+import random
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'off': OFF}
+
+
+class Tracer:
+    def __init__(self, level='off', path=None, echo=False, sample=1.0, buffer_size=10000, seed=None):
+        self.file = None
+        self.configure(level, path, echo, sample, buffer_size, seed)
+
+    def configure(self, level='off', path=None, echo=False, sample=1.0, buffer_size=10000, seed=None):
+        """
+        level: 'debug', 'info', 'warning' or 'off'; path: NDJSON file (None: no file);
+        echo: print the messages; sample: fraction of the records below WARNING that are kept.
+        """
+        self.close()
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.path = path
+        self.echo = echo
+        self.sample = sample
+        self.buffer_size = buffer_size
+        self.random = random.Random(seed)
+        self.buffer = []
+        self.file = open(path, 'w', encoding='utf-8') if path is not None and self.level < OFF else None
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, level, kind, time=None, pod=None, node=None, message=None, **fields):
+        """Record an event of the given kind (and print its message if echo)."""
+        if level < self.level:
+            return
+        if self.sample < 1 and level < WARNING and self.random.random() >= self.sample:
+            return
+        if self.echo:
+            print(message if message is not None else f'{kind} time={time} pod={pod} node={node} {fields}')
+        if self.file is not None:
+            record = {'time': time, 'kind': kind, 'pod': pod, 'node': node}
+            if message is not None:
+                record['message'] = message
+            record.update(fields)
+            self.buffer.append(record)
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+
+    def flush(self):
+        if self.file is not None and self.buffer:
+            self.file.write(''.join(json.dumps(record, default=str) + '\n' for record in self.buffer))
+            self.file.flush()
+        self.buffer = []
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def read_trace(path, kinds=None):
+    """Records of an NDJSON trace, in order (only the given kinds if any)."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if kinds is None or record['kind'] in kinds:
+                yield record
+
+
+# Tracer shared by the modules of the process
+tracer = Tracer()
+atexit.register(tracer.close)
+
+
+def configure(*args, **kwargs):
+    """Set up the shared tracer (see Tracer.configure)."""
+    tracer.configure(*args, **kwargs)
+    return tracer
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Selection and configuration of the MILP solver.
+
+SolverOptions gathers the settings of a solve (backend, number of threads,
+relative MIP gap, time limit, presolve). pulp_solver() turns them into a
+PuLP solver object and cbc_arguments() into the command line options of
+the CBC binary called by matrix_model.
+
+Backends:
+    'cbc'   CBC binary bundled with PuLP (default)
+    'glpk'  glpsol found on the PATH (single-threaded, threads is ignored)
+    'highs' HiGHS, in-process through highspy or else the highs binary
+backend='auto' picks the first installed backend of PREFERRED_BACKENDS.
+"""
+import re
+
+import pulp
+
+BACKENDS = ('cbc', 'glpk', 'highs')
+PREFERRED_BACKENDS = ('highs', 'cbc', 'glpk')
+
+
+class SolverOptions:
+    """
+    Settings of a solve. None keeps the default of the solver; gap is the
+    relative MIP gap (e.g. 0.01 for 1%) and time_limit is in seconds. msg
+    prints the solver log, on by default as with problem.solve().
+    """
+
+    def __init__(self, backend='cbc', threads=None, gap=None, time_limit=None, presolve=True, msg=True):
+        self.backend = backend
+        self.threads = threads
+        self.gap = gap
+        self.time_limit = time_limit
+        self.presolve = presolve
+        self.msg = msg
+
+    def replace(self, **changes):
+        """Copy of the options with some of the settings changed."""
+        options = SolverOptions(self.backend, self.threads, self.gap, self.time_limit, self.presolve, self.msg)
+        for key, value in changes.items():
+            if not hasattr(options, key):
+                raise AttributeError(f"Unknown solver option: {key}")
+            setattr(options, key, value)
+        return options
+
+    def result_settings(self):
+        """Settings which can change the solution (not threads and msg), e.g. to key cached results."""
+        return {'backend': self.backend, 'gap': self.gap, 'time_limit': self.time_limit, 'presolve': self.presolve}
+
+    def __repr__(self):
+        return (f"SolverOptions(backend={self.backend!r}, threads={self.threads!r}, gap={self.gap!r}, "
+                f"time_limit={self.time_limit!r}, presolve={self.presolve!r}, msg={self.msg!r})")
+
+
+def _highs_solver(presolve, warmStart, **kwargs):
+    """In-process HiGHS solver if highspy is installed, else the command line one."""
+    solver = pulp.HiGHS(presolve=presolve, **kwargs)
+    if solver.available():
+        return solver
+    return pulp.HiGHS_CMD(warmStart=warmStart, options=[f'presolve={presolve}'], **kwargs)
+
+
+def available_backends():
+    """Backends installed on this machine."""
+    found = []
+    if pulp.PULP_CBC_CMD(msg=False).available():
+        found.append('cbc')
+    if pulp.GLPK_CMD(msg=False).available():
+        found.append('glpk')
+    if pulp.HiGHS(msg=False).available() or pulp.HiGHS_CMD(msg=False).available():
+        found.append('highs')
+    return found
+
+
+def resolve_backend(backend):
+    """Name of the backend to use for backend (one of BACKENDS, or 'auto'/None)."""
+    if backend in (None, 'auto'):
+        found = available_backends()
+        for name in PREFERRED_BACKENDS:
+            if name in found:
+                return name
+        raise RuntimeError("No MILP solver available (install CBC, GLPK or HiGHS)")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown solver backend '{backend}', expected one of {BACKENDS} or 'auto'")
+    return backend
+
+
+def pulp_solver(options=None, warm_start=False, log_path=None):
+    """
+    PuLP solver object configured with the given SolverOptions. With
+    warm_start=True the initial values of the variables are passed to the
+    solver as a MIP start (CBC and the HiGHS binary); log_path is the file
+    where CBC writes its log.
+    """
+    if options is None:
+        options = SolverOptions()
+    backend = resolve_backend(options.backend)
+    if backend == 'cbc':
+        return pulp.PULP_CBC_CMD(msg=options.msg, timeLimit=options.time_limit, gapRel=options.gap,
+                                 threads=options.threads, options=[] if options.presolve else ['presolve off'],
+                                 warmStart=warm_start, logPath=log_path)
+    if backend == 'glpk':
+        glpk_options = []
+        if options.gap is not None:
+            glpk_options += ['--mipgap', str(options.gap)]
+        if not options.presolve:
+            glpk_options.append('--nopresol')
+        return pulp.GLPK_CMD(msg=options.msg, timeLimit=options.time_limit, options=glpk_options)
+    return _highs_solver(msg=options.msg, timeLimit=options.time_limit, gapRel=options.gap,
+                         threads=options.threads, presolve='on' if options.presolve else 'off',
+                         warmStart=warm_start)
+
+
+def cbc_log_stats(log):
+    """
+    Time of the first incumbent (seconds from the start of CBC, 0 for an
+    accepted MIP start) and final relative gap, read from the CBC log.
+    """
+    first_incumbent_time = None
+    if re.search(r"^Cbc0045I MIPStart provided solution with cost", log, re.MULTILINE):
+        first_incumbent_time = 0.0
+    else:
+        found = re.search(r"^Cbc0012I Integer solution of .* \(([\d.]+) seconds\)", log, re.MULTILINE)
+        if found:
+            first_incumbent_time = float(found.group(1))
+    gap = None
+    found = re.search(r"^Gap:\s+(\S+)", log, re.MULTILINE)
+    if found:
+        gap = float(found.group(1))
+    elif "Result - Optimal solution found" in log:
+        gap = 0.0
+    return {'first_incumbent_time': first_incumbent_time, 'gap': gap}
+
+
+def cbc_arguments(options):
+    """Command line options of the CBC binary (to be placed before -solve)."""
+    args = []
+    if options.threads is not None:
+        args += ['-threads', str(options.threads)]
+    if options.gap is not None:
+        args += ['-ratioGap', str(options.gap)]
+    if options.time_limit is not None:
+        args += ['-sec', str(options.time_limit)]
+    if not options.presolve:
+        args += ['-presolve', 'off']
+    return args
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Time series of the use of the nodes during a SimPy simulation.
+
+A monitor process samples, every interval of simulated time, the free CPU
+and memory of every node (their simpy.Container levels), the number of
+cloud nodes hosting at least one pod and the length of the backlog of the
+scheduler. Nothing is done per simulation event, and the samples are
+written in place into NumPy ring buffers allocated once; when the buffers
+are full the oldest samples are overwritten. The series are saved column
+by column in a compressed .npz file (see load_utilization).
+"""
+import os
+
+import numpy as np
+
+
+class UtilizationMonitor:
+    def __init__(self, env, nodes, interval, cloud=None, backlog=None, node_ids=None, until=None, capacity=None):
+        """
+        nodes: objects with cpu and memory containers and total_cpu, total_memory;
+        cloud: flags of the cloud nodes; backlog: function returning the
+        number of pods waiting; capacity: samples kept (default: enough for until).
+        """
+        self.env = env
+        self.interval = interval
+        self.cpu_levels = [node.cpu for node in nodes]
+        self.memory_levels = [node.memory for node in nodes]
+        self.total_cpu = np.array([node.total_cpu for node in nodes], dtype=float)
+        self.total_memory = np.array([node.total_memory for node in nodes], dtype=float)
+        self.cloud = np.zeros(len(nodes), dtype=bool) if cloud is None else np.asarray(cloud, dtype=bool)
+        self.node_ids = np.asarray(node_ids if node_ids is not None else range(len(nodes)))
+        self.backlog = backlog
+        if capacity is None:
+            capacity = int(until / interval) + 2 if until is not None else 1 << 16
+        self.capacity = capacity
+        self.time = np.zeros(capacity)
+        self.cpu = np.zeros((capacity, len(nodes)), dtype=np.float32)
+        self.memory = np.zeros((capacity, len(nodes)), dtype=np.float32)
+        self.active_cloud = np.zeros(capacity, dtype=np.int32)
+        self.queue = np.zeros(capacity, dtype=np.int32)
+        self.count = 0
+        self.stopped = False
+
+    def sample(self):
+        """Record the current state."""
+        row = self.count % self.capacity
+        self.time[row] = self.env.now
+        cpu, memory = self.cpu[row], self.memory[row]
+        cpu[:] = [container.level for container in self.cpu_levels]
+        memory[:] = [container.level for container in self.memory_levels]
+        self.active_cloud[row] = np.count_nonzero(self.cloud & (memory < self.total_memory))
+        self.queue[row] = self.backlog() if self.backlog is not None else 0
+        self.count += 1
+
+    def process(self):
+        """SimPy process sampling every interval until stop()."""
+        while not self.stopped:
+            self.sample()
+            yield self.env.timeout(self.interval)
+
+    def stop(self):
+        """Take a last sample and end the process (e.g. when the scheduler is done)."""
+        if not self.stopped:
+            self.sample()
+            self.stopped = True
+
+    def data(self):
+        """Series of the kept samples in time order, and the attributes of the nodes."""
+        kept = min(self.count, self.capacity)
+        order = np.arange(self.count - kept, self.count) % self.capacity
+        return dict(time=self.time[order], cpu=self.cpu[order], memory=self.memory[order],
+                    active_cloud=self.active_cloud[order], backlog=self.queue[order],
+                    total_cpu=self.total_cpu, total_memory=self.total_memory, cloud=self.cloud,
+                    node_id=self.node_ids, interval=self.interval, dropped=self.count - kept)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, **self.data())
+
+
+def load_utilization(path):
+    """Series saved by UtilizationMonitor.save, as a dict of arrays."""
+    with np.load(path) as f:
+        return {name: f[name] for name in f.files}
+
+
+def used_fraction(data, resource='cpu'):
+    """Fraction of the CPU (or memory) of each node in use at each sample."""
+    return 1 - data[resource] / data['total_' + resource]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Greedy initial solution of the container-node assignment ILP.
+
+The containers are placed one at a time (largest first) on the compatible
+node with the lowest weighted risk/price score that still has room, with
+the score of the greedy scheduler of event_simulator/queue_des.py
+(allocate_pod). The result is used as a MIP start, so that the solver has
+an incumbent from the beginning and time limited solves always return a
+feasible solution.
+"""
+import numpy as np
+
+
+def greedy_start(feasibility, cloud_containers, edge_containers, theta_risk=0.5, theta_el=0.5, multiplicity=None):
+    """
+    Greedy assignment on the pairs of the FeasibilityIndex. Returns the number
+    of containers placed on each pair (for a class-aggregated model, the
+    multiplicity of each container class is given) and whether all the
+    containers could be placed.
+    """
+    fi = feasibility
+    c, n = fi.c, fi.n
+    mult = np.ones(fi.nContainer, dtype=np.intp) if multiplicity is None else np.asarray(multiplicity, dtype=np.intp)
+    free_cpu = n['Ncore'].copy()
+    free_mem = n['mainMemory'].copy()
+    active = n['activation'].astype(float)
+
+    # Normalizations of allocate_pod
+    max_price = n['eprice'].max() if fi.nNode else 1
+    max_risk_cloud = n['risk'][n['is_cloud']].max() if n['is_cloud'].any() else 1
+    max_risk_edge = n['risk'][~n['is_cloud']].max() if (~n['is_cloud']).any() else 1
+    n_cloud = max(1, np.count_nonzero(n['is_cloud']))
+
+    counts = np.zeros(fi.nPair)
+    complete = True
+    for i in np.argsort(-c['Ncore'], kind='stable').tolist():
+        pairs = fi.pairs_of_container(i)
+        nodes = fi.pair_node[pairs]
+        risk, eprice = n['risk'][nodes], n['eprice'][nodes]
+        for _ in range(mult[i]):
+            if c['is_cloud'][i]:
+                score = (theta_risk/2 * risk/(max(cloud_containers, 1)*max_risk_cloud)
+                         + theta_el/3 * eprice/(max(cloud_containers, 1)*max_price)
+                         + theta_el/3 * (1 - active[nodes])*eprice/(n_cloud*max_price))
+            else:
+                score = (theta_risk/2 * risk/(max(edge_containers, 1)*max_risk_edge)
+                         + theta_el/3 * eprice/(max(edge_containers, 1)*max_price))
+            fits = np.flatnonzero((free_cpu[nodes] >= c['Ncore'][i]) & (free_mem[nodes] >= c['mainMemory'][i]))
+            if len(fits) == 0:
+                complete = False
+                break
+            k = fits[np.argmin(score[fits])]
+            counts[pairs[k]] += 1
+            free_cpu[nodes[k]] -= c['Ncore'][i]
+            free_mem[nodes[k]] -= c['mainMemory'][i]
+            active[nodes[k]] = 1
+    return counts, complete